@@ -12,6 +12,8 @@ import chat_exporter
 
 from cogs.helpers import views
 from utils.logging_setup import start_logging
+from utils.database.db import DatabaseManager, AsyncDatabaseManager
+from utils.api import CTFApi
 
 start_logging('tickets.log')
 
@@ -45,6 +47,8 @@ class TicketBot(commands.Bot):
         self.loop = loop
         self.persistent_views_added = False
         self.add_check(self.check_bot_perms)
+        DatabaseManager.connect()
+        CTFApi.connect(env.str("apikey"))
 
         ending_note = f"Type {BOT_PREFIX[0]}help command for more info on a command. \
 You can also type {BOT_PREFIX[0]}help category for more info on a category"
@@ -92,6 +96,11 @@ You can also type {BOT_PREFIX[0]}help category for more info on a category"
         log.info("-------------------")
         chat_exporter.init_exporter(self.user)
 
+    async def close(self):
+        await super().close()
+        await CTFApi.close()
+        await AsyncDatabaseManager.close()
+
     async def on_message(self, message):
         if message.author == self.user or message.author.bot or not message.guild:
             return
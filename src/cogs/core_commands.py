@@ -9,7 +9,9 @@ import cogs.helpers.views.action_views as action_views
 from cogs.helpers.views import command_views
 import cogs.helpers.actions as actions
 
-from utils.database.db import DatabaseManager as db
+from utils.database.db import AsyncDatabaseManager as db
+from utils.guild_cache import GuildCache
+from utils.background import AutoClose
 from utils.utility import Utility, UI
 from utils import exceptions, types
 
@@ -47,13 +49,13 @@ For help tickets:
         await Utility.delete_message(ctx)
 
     @commands.command(name="create", aliases=["new", "cr"])
-    @commands.cooldown(rate=5, per=10, type=commands.BucketType.default)
+    @commands.cooldown(rate=2, per=10, type=commands.BucketType.user)
     async def create(self, ctx: commands.Context, ticket_type: types.TicketType = "help", member: discord.Member = None):
         """create a new ticket for the user if non-admin, or with the user specified if admin"""
         if ticket_type not in {'help', 'submit', 'misc'}:
             await ctx.channel.send("possible ticket types are help, submit, and misc")
             return
-        admin = get(ctx.guild.roles, name=config.roles['admin'])
+        admin = GuildCache.of(ctx.guild).admin_role
         if admin not in ctx.author.roles:
             member = ctx.author
             create_ticket = actions.CreateTicket(self.bot,
@@ -68,7 +70,8 @@ For help tickets:
         await Utility.delete_message(ctx)
         try:
             await create_ticket.main()
-        except (exceptions.MaxUserTicketError, exceptions.MaxChannelTicketError, discord.errors.NotFound):
+        except (exceptions.MaxUserTicketError, exceptions.CreationQueueFull,
+                discord.errors.NotFound):
             pass
 
     @commands.command(name="add", aliases=["a"], help="add a user to a ticket")
@@ -83,7 +86,7 @@ For help tickets:
             await ctx.channel.send(embed=embed)
             return
 
-        admin = get(ctx.guild.roles, name=config.roles['admin'])
+        admin = GuildCache.of(ctx.guild).admin_role
         if admin in member.roles:
             embed = UI.Embed(description=f"User {member.name} is an admin")
             await ctx.channel.send(embed=embed)
@@ -102,7 +105,7 @@ For help tickets:
                 description=f"User {member.name} not in channel")
             await ctx.channel.send(embed=embed)
             return
-        admin = get(ctx.guild.roles, name=config.roles['admin'])
+        admin = GuildCache.of(ctx.guild).admin_role
         if admin in member.roles:
             embed = UI.Embed(description=f"User {member.name} is an admin")
             await ctx.channel.send(embed=embed)
@@ -114,11 +117,11 @@ For help tickets:
     async def close(self, ctx):
         """closes a ticket"""
         try:
-            user_id = db.get_user_id(ctx.channel.id)
+            user_id = await db.get_user_id(ctx.channel.id)
         except ValueError as e:
             return await ctx.channel.send(e.args[0])
         guild = ctx.guild
-        admin = get(guild.roles, name=config.roles['admin'])
+        admin = GuildCache.of(guild).admin_role
         if admin in ctx.author.roles or user_id == ctx.author.id:
 
             close_ticket = actions.CloseTicket(ctx.guild, ctx.author,
@@ -166,25 +169,29 @@ For help tickets:
         if channel is None:
             channel = ctx.channel
         if option == "off":
-            db.update_check("2", channel.id)
+            await db.update_check("2", channel.id)
             await ctx.channel.send(f"autoclose is now off for {ctx.channel.name}")
         else:
-            db.update_check("0", channel.id)
+            await db.update_check("0", channel.id)
             await ctx.channel.send(f"autoclose is now on for {ctx.channel.name}")
+        try:
+            AutoClose.schedule(channel, await db.get_ticket(channel.id))
+        except ValueError:
+            pass
 
     @commands.command(name="auto_message", aliases=["am"])
     @commands.has_role(config.roles['admin'])
     async def auto_message(self, ctx, channel: discord.TextChannel):
         """Sends a message asking if the ticket can be closed. Does not contribute to AC checks"""
         try:
-            user_id = db.get_user_id(channel.id)
+            user_id = await db.get_user_id(channel.id)
         except ValueError as e:
             return await ctx.channel.send(e.args[0])
 
         member = ctx.guild.get_member(int(user_id))
         message = f"If that is all we can help you with {member.mention}, please close this ticket.\n||I am a bot and this action was performed automatically||"
         random_admin = await Utility.random_admin_member(ctx.guild)
-        await Utility.say_in_webhook(self.bot, random_admin, channel, random_admin.avatar.url, True, message, return_message=True, view=action_views.CloseView())
+        await Utility.say_in_webhook(random_admin, channel, random_admin.avatar.url, True, message, return_message=True, view=action_views.CloseView())
 
         embed = UI.Embed(
             title="Auto Message", description=f"{random_admin.mention} said the auto close message in {channel.mention}")
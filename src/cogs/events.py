@@ -0,0 +1,87 @@
+import logging
+
+import discord
+from discord.ext import commands
+
+from utils.guild_cache import GuildCache
+from utils.channel_pool import ChannelPool
+from utils.options import Options
+from utils.webhook_cache import WebhookCache
+
+log = logging.getLogger(__name__)
+
+class Events(commands.Cog):
+    """keeps the per-guild caches, channel pools and webhooks in sync with discord"""
+
+    def __init__(self, bot: commands.Bot):
+        self.bot = bot
+
+    async def _prune_shard(self, category: discord.CategoryChannel):
+        """deletes an emptied overflow shard of a ticket category,
+        the first shard is always kept"""
+        if (category is None or Options.shard_index(category.name) == 1
+                or Options.shard_base(category.name) not in Options.ticket_categories()):
+            return
+        cache = GuildCache.of(category.guild)
+        # the same lock as placing a channel, so the shard is not picked while it is deleted
+        async with cache.shard_lock(Options.shard_base(category.name)):
+            if cache.shard_size(category):
+                return
+            try:
+                await category.delete(reason="Ticket category shard is empty")
+                log.info(f"Deleted empty shard {category} in {category.guild}")
+            except discord.HTTPException:
+                log.exception(f"Could not delete empty shard {category}")
+                return
+            cache.remove_category(category)
+
+    @commands.Cog.listener()
+    async def on_guild_role_create(self, role):
+        GuildCache.of(role.guild).invalidate_roles()
+
+    @commands.Cog.listener()
+    async def on_guild_role_delete(self, role):
+        GuildCache.of(role.guild).invalidate_roles()
+
+    @commands.Cog.listener()
+    async def on_guild_role_update(self, _before, after):
+        GuildCache.of(after.guild).invalidate_roles()
+
+    @commands.Cog.listener()
+    async def on_guild_channel_create(self, channel):
+        GuildCache.of(channel.guild).invalidate_channels()
+
+    @commands.Cog.listener()
+    async def on_guild_channel_delete(self, channel):
+        GuildCache.of(channel.guild).invalidate_channels()
+        GuildCache.of(channel.guild).unplace(channel.id)
+        ChannelPool.discard(channel)
+        WebhookCache.invalidate(channel.id)
+        await self._prune_shard(channel.category)
+
+    @commands.Cog.listener()
+    async def on_guild_channel_update(self, before, after):
+        if before.name != after.name or before.category != after.category:
+            GuildCache.of(after.guild).invalidate_channels()
+        if before.category != after.category:
+            await self._prune_shard(before.category)
+
+    @commands.Cog.listener()
+    async def on_webhooks_update(self, channel):
+        WebhookCache.invalidate(channel.id)
+
+    @commands.Cog.listener()
+    async def on_member_update(self, before, after):
+        if before.roles != after.roles:
+            GuildCache.of(after.guild).invalidate_members()
+
+    @commands.Cog.listener()
+    async def on_member_remove(self, member):
+        GuildCache.of(member.guild).invalidate_members()
+
+    @commands.Cog.listener()
+    async def on_guild_remove(self, guild):
+        GuildCache.forget(guild.id)
+
+def setup(bot: commands.Bot):
+    bot.add_cog(Events(bot))
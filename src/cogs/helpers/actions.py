@@ -1,22 +1,24 @@
-import json
 import os
 import asyncio
 import collections
 import logging
-from typing import List, Set, Tuple, Union, Optional
+from typing import Awaitable, Callable, List, Set, Tuple, Union, Optional
 
 import discord
 from discord.ext import commands
-from discord.utils import get
 import humanize
 
 import cogs.helpers.views.action_views as action_views
 import config
 
-from utils.database.db import DatabaseManager as db
+from utils.database.db import AsyncDatabaseManager as db
+from utils.guild_cache import GuildCache, SHARD_SIZE
+from utils.channel_pool import ChannelPool
+from utils.challenge_index import ChallengeIndex
+from utils.creation_queue import CreationQueue
 from utils.utility import Utility, UI, Challenge
 from utils.options import Options
-from utils.background import ScrapeChallenges
+from utils.background import ScrapeChallenges, AutoClose
 from utils import exceptions, types
 
 log = logging.getLogger(__name__)
@@ -35,6 +37,7 @@ class BaseActions:
             self.user_id = self.user.id
         self.channel = channel
         self.channel_id = channel.id
+        self.cache = GuildCache.of(guild)
 
     async def _log_to_channel(self, msg: str, *args, **kwargs) -> None:
         """Shorthand method to log messages
@@ -46,8 +49,54 @@ class BaseActions:
         """
         await UI.log_to_logs(msg, self.channel, self.user, *args, **kwargs)
 
-    async def _move_channel(self, category_name) -> discord.CategoryChannel:
-        """Fetches or creates the category
+    @staticmethod
+    def _shard_full(error: discord.HTTPException) -> bool:
+        return error.code == 50035 and "Maximum number of channels in category" in error.text
+
+    async def _place_channel(self, category_name,
+                             place: Callable[[discord.CategoryChannel], Awaitable[discord.abc.GuildChannel]]
+                             ) -> discord.abc.GuildChannel:
+        """Creates or moves a channel into the first shard of the category with
+        room for it, creating the next shard when every shard is full
+
+        The shard lock is held until the channel is placed, and a shard
+        Discord reports as full is skipped.
+
+        Parameters
+        ----------
+        category_name : `str`
+            The category\n
+        place : `Callable[[discord.CategoryChannel], Awaitable[discord.abc.GuildChannel]]`
+            Creates or moves the channel into the given shard\n
+
+        Returns
+        -------
+        `discord.abc.GuildChannel` : The placed channel
+        """
+        full = set()
+        async with self.cache.shard_lock(category_name):
+            while True:
+                shards = self.cache.shards(category_name)
+                category = next((category for category in shards
+                                 if category.id not in full and self.cache.shard_size(category) < SHARD_SIZE), None)
+                if category is None:
+                    shard = Options.shard_index(shards[-1].name) + 1 if shards else 1
+                    new_category = await self.guild.create_category(
+                        name=Options.shard_name(category_name, shard))
+                    category = self.guild.get_channel(new_category.id) or new_category
+                    self.cache.add_category(category)
+                try:
+                    channel = await place(category)
+                except discord.HTTPException as e:
+                    if not self._shard_full(e):
+                        raise
+                    full.add(category.id)
+                    continue
+                self.cache.place(category, channel.id)
+                return channel
+
+    async def _move_channel(self, category_name, **fields) -> discord.TextChannel:
+        """Moves the channel into a shard of the category, editing fields on the way
 
         Parameters
         ----------
@@ -56,40 +105,41 @@ class BaseActions:
 
         Returns
         -------
-        `discord.CategoryChannel` : The category
+        `discord.TextChannel` : The moved channel
         """
-        category = get(self.guild.categories, name=category_name)
-        if category is None:
-            new_category = await self.guild.create_category(name=category_name)
-            category = self.guild.get_channel(new_category.id)
-        return category
+        async def move(category):
+            return await self.channel.edit(category=category, **fields) or self.channel
+        return await self._place_channel(category_name, move)
 
     async def _ticket_information(self):
-        number = db.get_number_previous(self.channel_id)
-        current_type = db.get_ticket_type(self.channel_id)
         try:
-            user_id = db.get_user_id(self.channel_id)
+            ticket = await db.get_ticket(self.channel_id)
         except ValueError as e:
             return await self.channel.send(e.args[0])
-        user = self.guild.get_member(user_id)
+        user = self.guild.get_member(ticket.user_id)
 
-        return number, current_type, user_id, user
+        return ticket.number, ticket.t_type, ticket.user_id, user
 class CreateTicket(BaseActions):
     def __init__(self, bot: commands.Bot, ticket_type: types.TicketType, interaction: Optional[discord.Interaction], *args, **kwargs):
         self.bot = bot
         self.ticket_type = ticket_type
         if interaction:
-            self.send_pm = lambda m: interaction.response.send_message(
-                m, ephemeral=True)
+            # main() defers the interaction, every message is a followup
+            self.send_pm = lambda m: interaction.followup.send(m, ephemeral=True)
         else:
             self.send_pm = lambda m: self.user.send(m)
 
         self.ticket_channel: discord.TextChannel = None
+        self.interaction = interaction
         self._args = [interaction, args, kwargs]
         super().__init__(*args, **kwargs)
 
+    async def _queued(self, position: int):
+        if position > 1:
+            await self.send_pm(f"You are #{position} in the queue, your ticket will be created shortly")
+
     async def _setup(self):
-        admin = get(self.guild.roles, name=config.roles['admin'])
+        admin = self.cache.admin_role
         member = self.guild.get_member(self.user_id)
         if admin not in member.roles:
             await self._maximum_tickets()
@@ -100,7 +150,7 @@ class CreateTicket(BaseActions):
 
     async def _maximum_tickets(self):
         try:
-            n_tickets = db.get_user_open_tickets(
+            n_tickets = await db.get_user_open_tickets(
                 self.ticket_type, self.user_id)
         except ValueError as e:
             return await self.channel.send(e.args[0])
@@ -110,22 +160,13 @@ class CreateTicket(BaseActions):
             raise exceptions.MaxUserTicketError
 
     async def _create_ticket_channel(self) -> discord.TextChannel:
-        number = db.get_number_new(self.ticket_type, self.guild.id)
+        number = await db.reserve_number(self.ticket_type, self.guild.id)
         channel_name = Options.name_open(
             self.ticket_type, number, self.user)
-        cat = Options.full_category_name(self.ticket_type)
-        category = get(self.guild.categories, name=cat)
-        if category is None:
-            new_category = await self.guild.create_category(name=cat)
-            category = self.guild.get_channel(new_category.id)
-        if len(category.channels) > 49:
-            await self.send_pm("There are over 50 channels in the selected category. Please contact a server admin.")
-            raise exceptions.MaxChannelTicketError
-
-        admin = get(self.guild.roles, name=config.roles['admin'])
-        bots = get(self.guild.roles, name=config.roles['bot'])
-        muted = get(self.guild.roles, name=config.roles['muted'])
-        quarantine = get(self.guild.roles, name=config.roles['quarantine'])
+        admin = self.cache.admin_role
+        bots = self.cache.role('bot')
+        muted = self.cache.role('muted')
+        quarantine = self.cache.role('quarantine')
         member = self.guild.get_member(self.user_id)
 
         overwrites = {
@@ -140,12 +181,25 @@ class CreateTicket(BaseActions):
                 view_channel=False, create_instant_invite=False, send_messages=False)
         }
 
-        return await category.create_text_channel(channel_name, overwrites=overwrites)
+        channel = await ChannelPool.claim(self.guild, self.ticket_type, channel_name, overwrites)
+        if channel is not None:
+            return channel
+
+        return await self._place_channel(
+            Options.full_category_name(self.ticket_type),
+            lambda category: category.create_text_channel(channel_name, overwrites=overwrites))
 
     async def main(self) -> discord.TextChannel:
         """Creates a ticket"""
 
-        await self._setup()
+        if self.interaction and not self.interaction.response.is_done():
+            # interactions have to be answered within 3 seconds, the queue may take longer
+            await self.interaction.response.defer(ephemeral=True)
+        try:
+            await CreationQueue.of(self.guild).run(self.user_id, self._setup, self._queued)
+        except exceptions.CreationQueueFull:
+            await self.send_pm("Too many tickets are being created right now, please try again in a minute")
+            raise
 
         if self.ticket_type == "help":
             welcome_message = f'Welcome <@{self.user_id}>'
@@ -153,11 +207,10 @@ class CreateTicket(BaseActions):
 
         status = "open"
         check = "2"
-        db.create_ticket(self.ticket_channel.id, str(
+        await db.create_ticket(self.ticket_channel.id, str(
             self.ticket_channel), self.guild.id, self.user_id, self.ticket_type, status, check)
 
-        avail_mods = get(
-            self.guild.roles, name=config.roles['ticket ping'])
+        avail_mods = self.cache.role('ticket ping')
         if self.ticket_type == "help":
             helper = CreateTicketHelper(
                 self.ticket_channel, self.bot, self.ticket_type, self._args[0], *self._args[1], **self._args[2])
@@ -181,7 +234,11 @@ class CreateTicket(BaseActions):
         await ticket_channel_message.pin()
         await self.ticket_channel.purge(limit=1)
 
-        db.update_check("0", self.ticket_channel.id)
+        await db.update_check("0", self.ticket_channel.id)
+        # messages sent while the ticket was set up could not arm its deadline
+        await db.update_activity(self.ticket_channel.id, ticket_channel_message.created_at.timestamp(),
+                                 self.bot.user.id)
+        AutoClose.schedule(self.ticket_channel, await db.get_ticket(self.ticket_channel.id))
 
         await self._log_to_channel("Created ticket")
         log.info(
@@ -202,9 +259,8 @@ class CreateTicketHelper(CreateTicket):
         return [Challenge(
             i, f"chall{i}", f"author{i}", list_categories[i % len(categories)], i % 3 == 0) for i in range(num)]
 
-    async def _ask_for_challenge(self, challenges: List[Challenge]):
-        challenge_options = [discord.SelectOption(
-            label=(challenge.title[:23] + '..') if len(challenge.title) > 25 else challenge.title, value=f"{challenge.id}") for challenge in challenges]
+    async def _ask_for_challenge(self, challenge_ids: List[int]) -> Challenge:
+        challenge_options = ChallengeIndex.challenge_options(challenge_ids)
 
         while True:
             view = action_views.ChallengeView(author=self.user, custom_id=f"ticketing:challenge_request-{os.urandom(16).hex()}", options=challenge_options,
@@ -215,14 +271,12 @@ class CreateTicketHelper(CreateTicket):
                 break
             await select_messages.delete()
 
-        selected_challenge = [
-            ch for ch in challenges if ch.id == int(view.children[0]._selected_values[0])][0]
+        selected_challenge = ChallengeIndex.challenges[int(
+            view.children[0]._selected_values[0])]
         return selected_challenge
 
-    async def _ask_for_category(self, challenges: List[Challenge]) -> List[Challenge]:
-        categories = {ch.category for ch in challenges}
-        category_options = [discord.SelectOption(
-            label=cat, value=cat) for cat in categories]
+    async def _ask_for_category(self, challenge_ids: Set[int]) -> List[int]:
+        category_options = ChallengeIndex.category_options(challenge_ids)
         while True:
             view = action_views.ChallengeView(author=self.user, custom_id=f"ticketing:category_request-{os.urandom(16).hex()}", options=category_options,
                                               placeholder="Please choose a category")
@@ -231,35 +285,43 @@ class CreateTicketHelper(CreateTicket):
             if view.children[0]._selected_values:
                 break
             await select_messages.delete()
-        category_challenges = [
-            ch for ch in challenges if ch.category == view.children[0]._selected_values[0]]
+        category_challenges = ChallengeIndex.in_category(
+            view.children[0]._selected_values[0], challenge_ids)
         return category_challenges
 
-    async def _add_author_and_helpers(self, selected_challenge: Challenge) -> Set[Union[discord.Member, None]]:
+    async def _author_and_helper_overwrites(self, selected_challenge: Challenge) -> Tuple[Set[discord.Member], dict]:
+        """gets the authors of a challenge and the overwrites letting them
+        and its available helpers into the ticket
+
+        Parameters
+        ----------
+        selected_challenge : `Challenge`
+            the challenge\n
+
+        Returns
+        -------
+        `Set[discord.Member]`: the authors,
+        `dict`: the overwrites
+        """
         ch_authors = set()
-        if len(authors := selected_challenge.author.split('/')) > 1:
-            for author in authors:
-                author = await UtilityActions._add_member(author, selected_challenge.title, self.guild, self.ticket_channel)
-                ch_authors.add(author)
-        else:
-            author = await UtilityActions._add_member(selected_challenge.author, selected_challenge.title, self.guild, self.ticket_channel)
-            ch_authors.add(author)
+        for author in selected_challenge.author.split('/'):
+            if (member := UtilityActions._get_member(author, selected_challenge.title, self.guild)) is not None:
+                ch_authors.add(member)
 
-        if len(helpers := json.loads(selected_challenge.helper_id_list)):
-            for helper in helpers:
-                try:
-                    if db.get_helper_status(helper):
-                        await UtilityActions._add_member(int(helper), selected_challenge.title, self.guild, self.ticket_channel)
-                except ValueError:
-                    pass
-        return ch_authors  # Returns the author to be pinged on ticket creation
+        members = set(ch_authors)
+        for helper in await db.get_available_challenge_helpers(selected_challenge.id):
+            if (member := UtilityActions._get_member(helper, selected_challenge.title, self.guild)) is not None:
+                members.add(member)
+
+        overwrites = {member: discord.PermissionOverwrite(read_messages=True, send_messages=True)
+                      for member in members}
+        return ch_authors, overwrites
 
     async def challenge_selection(self) -> Set[Union[discord.Member, None]]:
         # challenges = CreateTicketHelper.fake_challenges(21)
         user_solved_challenges = await ScrapeChallenges.get_user_challenges(
             self.user_id)
-        challenges = [Challenge(*list(challenge))
-                      for challenge in db.get_all_challenges() if not Challenge(*list(challenge)).id in user_solved_challenges]
+        challenges = await ChallengeIndex.unsolved(user_solved_challenges)
 
         if len(challenges) < 1:
             await self.ticket_channel.send("There are no released challenges or you have solved all the currently released challenges")
@@ -270,14 +332,16 @@ class CreateTicketHelper(CreateTicket):
                                                   send_messages=False)
 
         if len(challenges) <= 25:
-            selected_challenge = await self._ask_for_challenge(list(reversed(challenges)))
+            selected_challenge = await self._ask_for_challenge(
+                ChallengeIndex.ordered(challenges, reverse=True))
         else:
             selected_challenge = await self._ask_for_challenge(await self._ask_for_category(challenges))
 
-        await self.ticket_channel.edit(topic=f"{selected_challenge.title} - {selected_challenge.author}")
+        overwrites = self.ticket_channel.overwrites
+        overwrites[member] = discord.PermissionOverwrite(read_messages=True)
+        await self.ticket_channel.edit(topic=f"{selected_challenge.title} - {selected_challenge.author}",
+                                       overwrites=overwrites)
 
-        await self.ticket_channel.set_permissions(member, read_messages=True,
-                                                  send_messages=None)
         user_message = await self.ticket_channel.send("What have your tried so far?")
 
         def user_response_check(message):
@@ -285,7 +349,14 @@ class CreateTicketHelper(CreateTicket):
         await self.bot.wait_for('message', check=user_response_check)
         await user_message.delete()
 
-        return await self._add_author_and_helpers(selected_challenge)
+        # authors and helpers only join once the user has described the problem
+        ch_authors, helper_overwrites = await self._author_and_helper_overwrites(selected_challenge)
+        if helper_overwrites:
+            overwrites = self.ticket_channel.overwrites
+            overwrites.update(helper_overwrites)
+            await self.ticket_channel.edit(overwrites=overwrites)
+
+        return ch_authors  # Returns the authors to be pinged on ticket creation
 
 class UtilityActions:
     @staticmethod
@@ -317,16 +388,13 @@ class UtilityActions:
 
     # change to member after website
     @staticmethod
-    async def _add_member(member_identifier: Union[str, int], challenge_title: str, guild: discord.Guild, ticket_channel: discord.TextChannel) -> Union[discord.Member, None]:
+    def _get_member(member_identifier: Union[str, int], challenge_title: str, guild: discord.Guild) -> Union[discord.Member, None]:
         # change to get_member after website
         if isinstance(member_identifier, str):
             author = guild.get_member_named(member_identifier)
         else:
             author = guild.get_member(member_identifier)
-        try:
-            await ticket_channel.set_permissions(author, read_messages=True,
-                                                 send_messages=True)
-        except discord.InvalidArgument:
+        if author is None:
             log.info(
                 f"Member {member_identifier} for challenge {challenge_title} does not exist.")
         return author
@@ -374,7 +442,7 @@ class CloseTicket(BaseActions):
     async def main(self, inactivity=False):
         """closes a ticket"""
         try:
-            current_status = db.get_status(self.channel_id)
+            current_status = await db.get_status(self.channel_id)
         except ValueError as e:
             return await self.channel.send(e.args[0])
 
@@ -392,22 +460,18 @@ class CloseTicket(BaseActions):
         member = self.guild.get_member(t_user_id)
         await self.channel.set_permissions(member, read_messages=None)
 
-        category = await self._move_channel("Closed Tickets")
-
         closed_name = Options.name_close(
             t_current_type, count=t_number, user=t_user)
-        await self.channel.edit(name=closed_name, category=category)
+        await self._move_channel("Closed Tickets", name=closed_name)
 
-        db.update_ticket_name(closed_name, self.channel_id)
+        await db.update_ticket_name(closed_name, self.channel_id)
 
-        channel_log_category = get(
-            self.guild.categories, name=config.logs["category"])
+        channel_log_category = self.cache.log_category
         if channel_log_category is None:
             await self.channel.send("logs category does not exist")
             return
-        channel_log = get(
-            self.guild.text_channels, category=channel_log_category, name=config.logs["name"])
-        if channel_log is None:
+        channel_log = self.cache.log_channel
+        if channel_log is None or channel_log.category != channel_log_category:
             await self.channel.send(f"{config.logs['name']} channel does not exist in category logs")
             return
 
@@ -434,10 +498,8 @@ class CloseTicket(BaseActions):
         await embed_message.edit(embed=close_stats_embed, view=action_views.ReopenDeleteView())
 
         status = "closed"
-        db.update_status(status, self.channel_id,)
+        await db.update_status(status, self.channel_id,)
 
-        channel_log = get(
-            self.guild.text_channels, name=config.logs['name'])
         close_stats_embed.title = "Closed ticket"
         close_stats_embed.set_footer(text=f"{self.channel}")
         await channel_log.send(embed=close_stats_embed)
@@ -451,7 +513,7 @@ class ReopenTicket(BaseActions):
     async def main(self):
         """reopens a ticket"""
         try:
-            test_status = db.get_status(self.channel_id)
+            test_status = await db.get_status(self.channel_id)
         except ValueError as e:
             return await self.channel.send(e.args[0])
 
@@ -461,27 +523,24 @@ class ReopenTicket(BaseActions):
 
         t_number, t_current_type, t_user_id, t_user = await self._ticket_information()
 
-        cat = Options.full_category_name(t_current_type)
-        category = get(self.guild.categories, name=cat)
-        if category is None:
-            new_category = await self.guild.create_category(name=cat)
-            category = self.guild.get_channel(new_category.id)
-
         member = self.guild.get_member(t_user_id)
         await self.channel.set_permissions(member, read_messages=True)
 
         reopened = Options.name_open(
             t_current_type, count=t_number, user=t_user)
-        await self.channel.edit(name=reopened, category=category)
-        db.update_ticket_name(reopened, self.channel_id)
+        channel = await self._move_channel(
+            Options.full_category_name(t_current_type), name=reopened)
+        await db.update_ticket_name(reopened, self.channel_id)
 
         status = "open"
-        db.update_status(status, self.channel_id)
+        await db.update_status(status, self.channel_id)
         reopened_embed = UI.Embed(
             description="Ticket was re-opened")
         reopened_embed.set_author(
             name=f"{self.user}", icon_url=f"{self.user.avatar.url}")
-        await self.channel.send(embed=reopened_embed, view=action_views.CloseView())
+        reopened_message = await self.channel.send(embed=reopened_embed, view=action_views.CloseView())
+        await db.update_activity(self.channel_id, reopened_message.created_at.timestamp(), reopened_message.author.id)
+        AutoClose.schedule(channel, await db.get_ticket(self.channel_id))
 
         await self._log_to_channel("Re-Opened ticket")
         log.info(
@@ -494,7 +553,7 @@ class DeleteTicket(BaseActions):
     async def main(self):
         """deletes a ticket"""
         try:
-            db.get_channel_name(self.channel_id)
+            await db.get_channel_name(self.channel_id)
         except ValueError as e:
             return await self.channel.send(e.args[0])
 
@@ -505,9 +564,9 @@ class DeleteTicket(BaseActions):
         await asyncio.sleep(5)
         await self.channel.delete()
 
-        db.move_ticket_to_archive(self.channel_id)
+        await db.move_ticket_to_archive(self.channel_id)
 
-        db.delete_ticket(self.channel_id)
+        await db.delete_ticket(self.channel_id)
 
         await self._log_to_channel("Deleted ticket")
         log.info(
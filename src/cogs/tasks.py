@@ -4,6 +4,8 @@ from discord.ext import commands
 import aiocron
 
 from utils.background import AutoClose, ScrapeChallenges, UpdateHelpers
+from utils.database.db import AsyncDatabaseManager as db
+from utils.channel_pool import ChannelPool
 from utils import exceptions
 
 log = logging.getLogger(__name__)
@@ -11,13 +13,6 @@ class Tasks(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
 
-        # @aiocron.crontab("* * * * * */5")
-        @aiocron.crontab("0 * * * *")
-        async def start_auto_close():
-            await AutoClose.main(self.bot, hours=48)
-            # await AutoClose.main(self.bot, seconds=2)
-            log.info("Finished Task AutoClose")
-
         @aiocron.crontab("0 10 * * *")
         async def start_scraping_challenges_9():
             await ScrapeChallenges.main(self.bot)
@@ -41,6 +36,30 @@ class Tasks(commands.Cog):
                 await ScrapeChallenges.main(self.bot)
             log.info("Finished Task UpdateHelpers for every 10 minutes")
 
+        @aiocron.crontab("0 4 * * *")
+        async def start_database_maintenance():
+            report = await db.run_maintenance()
+            log.info(
+                f"Finished Task DatabaseMaintenance, reclaimed {report.bytes_reclaimed} bytes")
+
+    @commands.Cog.listener()
+    async def on_message(self, message):
+        if message.guild is None:
+            return
+        await AutoClose.record_activity(message)
+
+    @commands.Cog.listener()
+    async def on_ready(self):
+        for guild in self.bot.guilds:
+            ChannelPool.start(guild)
+        await AutoClose.sync_activity(self.bot)
+        log.info("Synced ticket activity")
+        await AutoClose.main(self.bot)
+        log.info("Started Task AutoClose")
+
+    def cog_unload(self):
+        if AutoClose.scheduler is not None:
+            AutoClose.scheduler.stop()
 
 def setup(bot):
     bot.add_cog(Tasks(bot))
@@ -1,5 +1,4 @@
 import asyncio
-from collections import defaultdict
 import json
 import typing
 import logging
@@ -10,9 +9,12 @@ from discord.utils import get
 
 import config
 
-from utils.database.db import DatabaseManager as db
+from utils.database.db import AsyncDatabaseManager as db
+from utils.guild_cache import GuildCache
+from utils.challenge_index import ChallengeIndex
+from utils.api import CTFApi
 from utils.background import ScrapeChallenges, UpdateHelpers
-from utils.utility import Utility, UI, Challenge
+from utils.utility import Utility, UI
 from utils import exceptions, types
 
 log = logging.getLogger(__name__)
@@ -27,14 +29,14 @@ class UtilityCommands(commands.Cog):
     async def say(self, ctx, *, message):
         """says a message through a webhook"""
 
-        await Utility.say_in_webhook(self.bot, ctx.author, ctx.channel, ctx.author.avatar.url, False, message)
+        await Utility.say_in_webhook(ctx.author, ctx.channel, ctx.author.avatar.url, False, message)
         await ctx.message.delete()
 
     @commands.command(name="sayuser", aliases=["sayu"])
     @commands.has_role(config.roles['admin'])
     async def saymember(self, ctx, user: discord.User, *, message):
         """says a message through a webhook through the specified user"""
-        await Utility.say_in_webhook(self.bot, user, ctx.channel, user.avatar.url, False, message)
+        await Utility.say_in_webhook(user, ctx.channel, user.avatar.url, False, message)
         await ctx.message.delete()
 
     @commands.command(name="about")
@@ -133,17 +135,13 @@ class UtilityCommands(commands.Cog):
         embed.set_author(name=f"{ctx.author}",
                          icon_url=f"{ctx.author.avatar.url}")
 
-        challenges = [Challenge(*list(challenge))
-                      for challenge in db.get_all_challenges()]
-        challenges_by_category = defaultdict(list)
-        for challenge in challenges:
-            challenges_by_category[challenge.category].append(challenge)
-        for category, challenge_list in challenges_by_category.items():
+        await ChallengeIndex.load()
+        for category, challenge_ids in ChallengeIndex.by_category.items():
             embed.add_field(name=category, value='=' *
                             int(len(category) * .9), inline=False)
-            for challenge in challenge_list:
+            for challenge_id in challenge_ids:
                 embed.add_field(
-                    name=challenge.title, value='_ _', inline=True)
+                    name=ChallengeIndex.challenges[challenge_id].title, value='_ _', inline=True)
         await ctx.channel.send(embed=embed)
 
         await ctx.message.delete()
@@ -160,6 +158,7 @@ class UtilityCommands(commands.Cog):
         await ctx.message.delete()
         message = await ctx.channel.send(embed=embed)
 
+        CTFApi.invalidate()
         await ScrapeChallenges.main(self.bot)
 
         embed.description = "challenges refreshed"
@@ -170,7 +169,7 @@ class UtilityCommands(commands.Cog):
     async def helper_user(self, ctx):
         """Base helper-user command. Shows helper's stats"""
         try:
-            status = db.get_helper_status(ctx.author.id)
+            status = await db.get_helper_status(ctx.author.id)
         except ValueError as e:
             return await ctx.channel.send(e.args[0])
 
@@ -190,7 +189,7 @@ class UtilityCommands(commands.Cog):
         if not status in typing.get_args(types.HelperAvailable):
             return await ctx.channel.send("choice must be 1 or 0")
 
-        db.update_helper_status(ctx.author.id, status)
+        await db.update_helper_status(ctx.author.id, status)
 
         if status == 1:
             await ctx.channel.send("you will now be added to any future tickets for challenges you have solved")
@@ -225,10 +224,10 @@ class UtilityCommands(commands.Cog):
     @commands.has_role(config.roles['admin'])
     async def helper_admin(self, ctx):
         """Base helper-admin command. Shows stats on helpers."""
-        helper_role = get(ctx.guild.roles, name=config.roles['helper'])
+        helper_role = GuildCache.of(ctx.guild).role('helper')
         if len(helper_role.members):
             helper_ids = [helper.id for helper in helper_role.members]
-            db_helpers = db.get_all_helpers()
+            db_helpers = await db.get_all_helpers()
             helpers = set(helper_ids).intersection(db_helpers)
 
             helpers = '\n'.join(
@@ -249,7 +248,7 @@ class UtilityCommands(commands.Cog):
     @commands.has_role(config.roles['admin'])
     async def helper_add(self, ctx, member: discord.Member):
         """adds a helper"""
-        helper_role = get(member.guild.roles, name=config.roles['helper'])
+        helper_role = GuildCache.of(member.guild).role('helper')
         helper_ids = [helper.id for helper in helper_role.members]
         if member.id in helper_ids:
             embed = UI.Embed(
@@ -261,7 +260,7 @@ class UtilityCommands(commands.Cog):
             return await ctx.channel.send(embed=embed)
 
         await member.add_roles(helper_role)
-        db.create_helper(member.id)
+        await db.create_helper(member.id)
 
         embed = UI.Embed(
             description=f"Added {member.mention} to {config.roles['helper']}")
@@ -276,7 +275,7 @@ class UtilityCommands(commands.Cog):
     @commands.has_role(config.roles['admin'])
     async def helper_remove(self, ctx, member: discord.Member):
         """removes a helper"""
-        helper_role = get(member.guild.roles, name=config.roles['helper'])
+        helper_role = GuildCache.of(member.guild).role('helper')
         helper_ids = [helper.id for helper in helper_role.members]
         if member.id not in helper_ids:
             embed = UI.Embed(
@@ -289,7 +288,7 @@ class UtilityCommands(commands.Cog):
             return
 
         await member.remove_roles(helper_role)
-        db.delete_helper(member.id)
+        await db.delete_helper(member.id)
 
         embed = UI.Embed(
             description=f"Removed {member.mention} from role {config.roles['helper']}")
@@ -312,7 +311,7 @@ class UtilityCommands(commands.Cog):
         await ctx.message.delete()
 
         try:
-            await UpdateHelpers.main(self.bot)
+            await UpdateHelpers.main(self.bot, full=True)
         except exceptions.ChallengeDoesNotExist as e:
             embed.description = f"challenge id {e.args[0]} does not exist. getting new challenges..."
             await message.edit(embed=embed)
@@ -1,6 +1,6 @@
 admin = {"owners": [650187980606275589, 720055120137552042, 572630612469481492],
          "startup_cogs": ["cogs.admin_commands", "cogs.core_commands",
-                          "cogs.utility_commands", "cogs.tasks"]}
+                          "cogs.utility_commands", "cogs.tasks", "cogs.events"]}
 
 roles = {"admin": "Board",
          "bot": "Trusted Bots",
@@ -16,6 +16,36 @@ tickets = {"emojis": ['<:rooSupport:811702778622771232>',
                       '📩', '<:imagine:871115444856160296>']}
 # ['🚩', '📩', '🧐']
 
-api = {"base_link": "https://imaginaryctf.org/api"}
+api = {"base_link": "https://imaginaryctf.org/api",
+       "timeout_seconds": 15,
+       "connections": 10,  # open connections to the API at once
+       "keepalive_seconds": 60,
+       "dns_cache_seconds": 300,
+       "ttl_seconds": {"/challenges/released": 300,  # by endpoint prefix, 0 only revalidates
+                       "/solves/": 120},
+       "cache_size": 1024,
+       "team_ttl_seconds": 24 * 60 * 60}  # how long a user's team is trusted
 
 transcript = {"domain": "https://oreos.imaginaryctf.org"}
+
+database = {"path": "utils/database/bot.db",
+            "synchronous": "NORMAL",  # safe with WAL, skips an fsync per commit
+            "cache_size_kib": 16 * 1024,
+            "mmap_size": 64 * 1024 * 1024,
+            "archive_max_age_days": 180,  # older archived tickets are exported
+            "archive_export_dir": "utils/database/exports",
+            "archive_season_format": "%Y"}
+
+channel_pool = {"size": {"help": 0, "submit": 0, "misc": 0},  # hidden channels kept ready, 0 disables
+                "name": "pool"}
+
+creation_queue = {"workers": 2,  # ticket channels created at once per guild
+                  "max_pending": 50}  # queued creations per guild before new ones are turned away
+
+helper_sync = {"concurrency": 8,  # helpers whose solves are fetched at once
+               "requests_per_second": 10}
+
+autoclose = {"inactive_hours": 48,  # reminder, then close after as long again
+             "concurrency": 10,  # channels checked at once across all guilds
+             "guild_concurrency": 4,  # channels checked at once per guild
+             "retry_minutes": 60}  # delay before re-checking a ticket whose check failed
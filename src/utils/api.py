@@ -0,0 +1,169 @@
+import time
+import asyncio
+from collections import OrderedDict
+from typing import Dict, NamedTuple, Optional, Union
+import logging
+
+import aiohttp
+from environs import Env
+
+import config
+from utils import exceptions
+
+log = logging.getLogger(__name__)
+
+class RateLimiter():
+    """Spaces out requests to at most `rate` per second"""
+
+    def __init__(self, rate: float):
+        self._interval = 1 / rate
+        self._next = 0.0
+
+    async def wait(self):
+        loop = asyncio.get_event_loop()
+        now = loop.time()
+        slot = max(now, self._next)
+        self._next = slot + self._interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+class _Cached(NamedTuple):
+    expires: float
+    etag: Optional[str]
+    last_modified: Optional[str]
+    data: Union[list, dict]
+
+class CTFApi():
+    """The one HTTP client for config.api['base_link']
+
+    Opened by the bot next to the database and closed on shutdown. The
+    session, its keep-alive connections and the API key are shared by every
+    request instead of being set up per call.
+
+    Responses are cached for the TTL of their endpoint in
+    config.api['ttl_seconds'], then revalidated with ETag and
+    If-Modified-Since when the server sent them. Only the most recently
+    used config.api['cache_size'] responses are kept.
+    """
+
+    _session: Optional[aiohttp.ClientSession] = None
+    _params: Dict[str, str] = {}
+    _cache: "OrderedDict[str, _Cached]" = OrderedDict()
+
+    @classmethod
+    def connect(cls, apikey: str = None):
+        """loads the API key, the session itself is opened on the first request
+
+        Parameters
+        ----------
+        apikey : `str`, `optional`
+            the API key, by default read from the environment\n
+        """
+        if apikey is None:
+            env = Env()
+            env.read_env()
+            apikey = env.str('apikey')
+        cls._params = {'apikey': apikey}
+
+    @classmethod
+    def _client(cls) -> aiohttp.ClientSession:
+        if cls._session is None or cls._session.closed:
+            if not cls._params:
+                cls.connect()
+            connector = aiohttp.TCPConnector(
+                limit_per_host=config.api['connections'],
+                ttl_dns_cache=config.api['dns_cache_seconds'],
+                keepalive_timeout=config.api['keepalive_seconds'])
+            cls._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=config.api['timeout_seconds']))
+        return cls._session
+
+    @staticmethod
+    def ttl(path: str) -> float:
+        """seconds a response is fresh for, from the longest matching endpoint prefix"""
+        prefixes = [prefix for prefix in config.api['ttl_seconds'] if path.startswith(prefix)]
+        return config.api['ttl_seconds'][max(prefixes, key=len)] if prefixes else 0
+
+    @classmethod
+    def invalidate(cls, prefix: str = ""):
+        """drops the cached responses of every endpoint starting with prefix
+
+        Parameters
+        ----------
+        prefix : `str`, `optional`
+            endpoint prefix, by default every endpoint\n
+        """
+        for path in [path for path in cls._cache if path.startswith(prefix)]:
+            del cls._cache[path]
+
+    @classmethod
+    def _store(cls, path: str, cached: _Cached):
+        cls._cache[path] = cached
+        cls._cache.move_to_end(path)
+        while len(cls._cache) > config.api['cache_size']:
+            cls._cache.popitem(last=False)
+
+    @classmethod
+    async def get(cls, path: str, limiter: RateLimiter = None,
+                  strict: bool = False) -> Union[list, dict]:
+        """GETs an API endpoint
+
+        Parameters
+        ----------
+        path : `str`
+            endpoint path, e.g. /challenges/released\n
+        limiter : `RateLimiter`, `optional`
+            paces the request, by default None\n
+        strict : `bool`, `optional`
+            raise instead of falling back when the request fails, by default False\n
+
+        Returns
+        -------
+        `Union[list, dict]`: the decoded JSON, the stale cached response or
+        an empty list if the request failed
+
+        Raises
+        ------
+        `exceptions.APIError`: the request failed and strict is set
+        """
+        cached = cls._cache.get(path)
+        if cached is not None and cached.expires > time.time():
+            cls._cache.move_to_end(path)
+            return cached.data
+
+        headers = {}
+        if cached is not None and cached.etag:
+            headers['If-None-Match'] = cached.etag
+        if cached is not None and cached.last_modified:
+            headers['If-Modified-Since'] = cached.last_modified
+        if limiter is not None:
+            await limiter.wait()
+        try:
+            async with cls._client().get(config.api['base_link'] + path, params=cls._params, headers=headers) as resp:
+                if resp.status == 304 and cached is not None:
+                    cls._store(path, cached._replace(expires=time.time() + cls.ttl(path)))
+                    return cached.data
+                if not resp.status == 200:
+                    log.warning("Fetching %s failed with %s", path, resp.status)
+                    return cls._fallback(path, cached, strict)
+                data = await resp.json()
+                if cls.ttl(path) or resp.headers.get('ETag') or resp.headers.get('Last-Modified'):
+                    cls._store(path, _Cached(time.time() + cls.ttl(path), resp.headers.get('ETag'),
+                                             resp.headers.get('Last-Modified'), data))
+                return data
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            log.warning("Fetching %s failed", path, exc_info=True)
+            return cls._fallback(path, cached, strict)
+
+    @staticmethod
+    def _fallback(path: str, cached: Optional[_Cached], strict: bool) -> Union[list, dict]:
+        if strict:
+            raise exceptions.APIError(f"Fetching {path} failed")
+        return cached.data if cached is not None else []
+
+    @classmethod
+    async def close(cls):
+        if cls._session is not None:
+            await cls._session.close()
+            cls._session = None
@@ -4,60 +4,147 @@
 2 = channel will be ignored
 """
 
-from datetime import timedelta
-import json
-from typing import Dict, List
+import time
+import asyncio
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Set, Tuple
 import logging
 
 import discord
 from discord.ext import commands
-from environs import Env
-import aiohttp
 
 import cogs.helpers.views.action_views as action_views
 import cogs.helpers.actions as actions
 from utils import types, exceptions
 from utils.options import Options
-from utils.utility import Utility, UI, Challenge
-from utils.database.db import DatabaseManager as db
+from utils.guild_cache import GuildCache
+from utils.channel_pool import ChannelPool
+from utils.challenge_index import ChallengeIndex
+from utils.utility import Utility, UI, Challenge, TicketRecord
+from utils.database.db import AsyncDatabaseManager as db
+from utils.scheduler import DeadlineScheduler
+from utils.api import CTFApi, RateLimiter
 import config
 
 log = logging.getLogger(__name__)
 
 class AutoClose(commands.Cog):
-    """Autoclose ticket manager"""
+    """Autoclose ticket manager
+
+    Every open help ticket has a deadline in the scheduler, armed from its
+    last activity. New messages push the deadline back, and only tickets
+    whose deadline passes are looked at.
+    """
+
+    scheduler: DeadlineScheduler = None
+
+    @classmethod
+    def inactivity(cls) -> timedelta:
+        """time without messages before a ticket is reminded or closed"""
+        return timedelta(hours=config.autoclose['inactive_hours'])
+
+    @classmethod
+    def admin_ids(cls, guild: discord.Guild) -> Set[int]:
+        return GuildCache.of(guild).admin_ids
+
+    @classmethod
+    def schedule(cls, channel: discord.TextChannel, ticket: TicketRecord):
+        """arms the deadline of a ticket from its last activity,
+        or disarms it if the ticket is not subject to autoclose
+
+        Parameters
+        ----------
+        channel : `discord.TextChannel`
+            the ticket channel\n
+        ticket : `TicketRecord`
+            the channel's ticket\n
+        """
+        if cls.scheduler is None:
+            return
+        category = getattr(channel, 'category', None)
+        if (ticket.bg_check == 2 or ticket.status != "open" or category is None
+                or Options.shard_base(category.name) != Options.full_category_name("help")):
+            cls.scheduler.cancel(channel.id)
+            return
+        last_time, _ = cls.get_last_activity(channel, ticket)
+        cls.scheduler.schedule(
+            channel.id, (last_time + cls.inactivity()).timestamp())
 
     @classmethod
-    async def get_message_time(cls, channel: discord.TextChannel):
-        """get the total time of the last message send
+    def get_last_activity(cls, channel: discord.TextChannel, ticket: TicketRecord) -> Tuple[datetime, Optional[int]]:
+        """get the time and author of the last message without calling the API
+
+        Uses the activity recorded from on_message, or the snowflake of
+        channel.last_message_id if that is newer, or the channel's creation time.
 
         Parameters
         ----------
-        channel : `str`
-            channel to get message from
+        channel : `discord.TextChannel`
+            the ticket channel\n
+        ticket : `TicketRecord`
+            the channel's ticket\n
+
+        Returns
+        -------
+        `Tuple[datetime, Optional[int]]`: time of the last message and its author's id, if known
+        """
+        last_time, last_author_id = channel.created_at, None
+        if ticket.last_activity is not None:
+            last_time = datetime.fromtimestamp(
+                ticket.last_activity, tz=timezone.utc)
+            last_author_id = ticket.last_author_id
+        if channel.last_message_id is not None:
+            snowflake_time = discord.utils.snowflake_time(
+                channel.last_message_id)
+            if snowflake_time > last_time:
+                last_time, last_author_id = snowflake_time, None
+        return last_time, last_author_id
 
-        Returns:
-            duration (int): duration from message creation till now
-            message: the message
+    @classmethod
+    async def record_activity(cls, message: discord.Message):
+        """store the time and author of a message sent in a ticket channel
+
+        Parameters
+        ----------
+        message : `discord.Message`
+            the new message\n
         """
+        category = getattr(message.channel, 'category', None)
+        if category is None or Options.shard_base(category.name) not in Options.ticket_categories():
+            return
+        await db.update_activity(message.channel.id, message.created_at.timestamp(), message.author.id)
         try:
-            message_list = await channel.history(limit=1).flatten()
-            try:
-                message = message_list[0]
-            except IndexError:
-                return
-        except discord.errors.NotFound as e:
-            log.warning(e)
+            ticket = await db.get_ticket(message.channel.id)
+        except ValueError:
             return
-        else:
-            pass
-        old = message.created_at
-        now = discord.utils.utcnow()
-        return message, now - old
+        if ticket.bg_check == 1 and message.author.id in cls.admin_ids(message.guild):
+            await db.update_check("0", message.channel.id)
+        cls.schedule(message.channel, ticket)
+
+    @classmethod
+    async def sync_activity(cls, bot: commands.Bot):
+        """catch up on messages sent while the bot was offline
+        from each ticket channel's last_message_id
+
+        Parameters
+        ----------
+        bot : `discord.commands.Bot`
+            the bot\n
+        """
+        for guild in bot.guilds:
+            for channel_id, ticket in (await db.get_guild_tickets(guild.id)).items():
+                channel = guild.get_channel(channel_id)
+                if channel is None or channel.last_message_id is None:
+                    continue
+                last_time = discord.utils.snowflake_time(
+                    channel.last_message_id).timestamp()
+                if ticket.last_activity is None or ticket.last_activity < last_time:
+                    author_id = channel.last_message.author.id if channel.last_message else None
+                    await db.update_activity(channel_id, last_time, author_id)
 
     @classmethod
     async def old_ticket_actions(cls, bot: commands.Bot, guild: discord.Guild,
-                                 channel: discord.TextChannel, message: discord.Message):
+                                 channel: discord.TextChannel):
         """Check if a channel is old
 
         If check is 0, send a polite message and set check to 1.
@@ -72,150 +159,285 @@ class AutoClose(commands.Cog):
             the guild\n
         channel : `discord.TextChannel`
             the channel\n
-        message : `discord.message.Message`
-            the latest message\n
         """
         try:
-            check = int(db.get_check(channel.id))
+            ticket = await db.get_ticket(channel.id)
         except ValueError as e:
             log.info(e.args[0])
             return
+        check = ticket.bg_check
         log.info(f"check: {check}- {channel}")
 
         if check == 1:
             close = actions.CloseTicket(guild, bot, channel, background=True)
             await close.main(inactivity=True)
-            db.update_check("0", channel.id)
+            await db.update_check("0", channel.id)
 
         elif check == 0:
-            try:
-                user_id = db.get_user_id(channel.id)
-            except ValueError as e:
-                return log.info(e.args[0])
-            member = guild.get_member(int(user_id))
+            member = guild.get_member(ticket.user_id)
             message = f"If that is all we can help you with {member.mention}, please close this ticket."
             random_admin = await Utility.random_admin_member(guild)
-            await Utility.say_in_webhook(bot, random_admin, channel, random_admin.avatar.url, True, message, return_message=True, view=action_views.CloseView())
+            reminder = await Utility.say_in_webhook(random_admin, channel, random_admin.avatar.url, True, message, return_message=True, view=action_views.CloseView())
             log.info(
                 f"{random_admin.name} said the auto close message in {channel.name}")
-            db.update_check("1", channel.id)
+            # record the reminder now so the deadline is not re-armed in the past
+            # if its on_message event arrives late
+            await db.update_activity(channel.id, discord.utils.snowflake_time(reminder.id).timestamp())
+            await db.update_check("1", channel.id)
         else:  # ticket ignored
             pass
 
     @classmethod
-    async def main(cls, bot: commands.Bot, **kwargs):
-        """check for inactivity in a channel
+    async def check_channel(cls, bot: commands.Bot, guild: discord.Guild, channel: discord.TextChannel,
+                            ticket: TicketRecord, admin_ids: Set[int]):
+        """check one ticket channel for inactivity and re-arm its deadline
 
         Parameters
         ----------
         bot : `discord.commands.Bot`
-            [description]\n
+            the bot\n
+        guild : `discord.guild.Guild`
+            the guild\n
+        channel : `discord.TextChannel`
+            the ticket channel\n
+        ticket : `TicketRecord`
+            the channel's ticket\n
+        admin_ids : `Set[int]`
+            ids of the guild's admins\n
         """
-        cat = Options.full_category_name("help")
-        for guild in bot.guilds:
-            safe_tickets_list = db.get_guild_safe_tickets(guild.id)
-            category = discord.utils.get(guild.categories, name=cat)
-            if category is None:
-                return
-            channels = category.text_channels
-            for channel in channels:
-                log.debug(channel.name)
-                try:
-                    status = db.get_status(channel.id)
-                except ValueError as e:
-                    log.info(e.args[0])
-                    continue
+        log.debug(channel.name)
+        if ticket.bg_check == 2 or ticket.status == "closed" or ticket.status is None:
+            cls.schedule(channel, ticket)
+            return
 
-                if channel.id in safe_tickets_list or status == "closed" or status is None:
-                    continue
+        last_time, last_author_id = cls.get_last_activity(channel, ticket)
+        duration = discord.utils.utcnow() - last_time
 
-                try:
-                    message, duration = await cls.get_message_time(channel)
-                except:
-                    continue
+        if duration < cls.inactivity():
+            if last_author_id in admin_ids and ticket.bg_check == 1:
+                await db.update_check("0", channel.id)
+        else:
+            await cls.old_ticket_actions(bot, guild, channel)
+        cls.schedule(channel, ticket)
 
-                if duration < timedelta(**kwargs):
-                    try:
-                        check = int(db.get_check(channel.id))
-                    except ValueError as e:
-                        log.info(e.args[0])
-                        continue
+    @classmethod
+    async def on_deadline(cls, bot: commands.Bot, channel_id: int):
+        """called by the scheduler when a ticket's deadline passes
+
+        Parameters
+        ----------
+        bot : `discord.commands.Bot`
+            the bot\n
+        channel_id : `int`
+            the ticket channel's id\n
+        """
+        if (channel := bot.get_channel(channel_id)) is None:
+            return
+        try:
+            ticket = await db.get_ticket(channel_id)
+        except ValueError as e:
+            log.info(e.args[0])
+            return
+        await cls.check_channel(bot, channel.guild, channel, ticket, cls.admin_ids(channel.guild))
+
+    @classmethod
+    async def check_guild(cls, bot: commands.Bot, guild: discord.Guild, semaphore: asyncio.Semaphore):
+        """check every ticket channel of a guild for inactivity,
+        at most config.autoclose['guild_concurrency'] at a time
+
+        Parameters
+        ----------
+        bot : `discord.commands.Bot`
+            the bot\n
+        guild : `discord.guild.Guild`
+            the guild\n
+        semaphore : `asyncio.Semaphore`
+            limits the channels checked at once across all guilds\n
+        """
+        categories = GuildCache.of(guild).ticket_categories("help")
+        if not categories:
+            log.info(f"{guild} has no {Options.full_category_name('help')} category")
+            return
+        channels = [channel for category in categories for channel in category.text_channels
+                    if not ChannelPool.is_pooled(channel)]
+        tickets = await db.get_tickets([channel.id for channel in channels])
 
-                    admin = discord.utils.get(
-                        guild.roles, name=config.roles['admin'])
-                    people = [member.id for member in admin.members]
+        admin_ids = cls.admin_ids(guild)
+        guild_semaphore = asyncio.Semaphore(
+            config.autoclose['guild_concurrency'])
 
-                    if message.author.id in people and check == 1:
-                        db.update_check("0", channel.id)
+        async def limited_check(channel: discord.TextChannel):
+            if (ticket := tickets.get(channel.id)) is None:
+                log.info(f"No channel exists with id {channel.id}")
+                return
+            async with guild_semaphore, semaphore:
+                try:
+                    await cls.check_channel(bot, guild, channel, ticket, admin_ids)
+                except Exception:
+                    log.exception(f"AutoClose failed for {channel} in {guild}")
 
-                elif duration > timedelta(**kwargs):
-                    await cls.old_ticket_actions(bot, guild, channel, message)
+        await asyncio.gather(*(limited_check(channel) for channel in channels))
 
-class ScrapeChallenges():
-    """Scrapes challenges"""
     @classmethod
-    def _setup(cls) -> Dict[str, str]:
-        env = Env()
-        env.read_env()
-        return {'apikey': env.str('apikey')}
+    async def main(cls, bot: commands.Bot):
+        """rebuild every deadline from the database and start the scheduler
 
-    @classmethod
-    async def _fetch(cls, client: aiohttp.ClientSession, url: str, params=None) -> Dict[str, str]:
-        async with client.get(url, params=params) as resp:
-            if not resp.status == 200:
-                log.warning("Fetching %s failed", url)
-                return []
-            return await resp.json()
+        Tickets that expired while the bot was offline are handled right away,
+        checking every guild's ticket channels concurrently.
+
+        Parameters
+        ----------
+        bot : `discord.commands.Bot`
+            the bot\n
+        """
+        if cls.scheduler is None:
+            cls.scheduler = DeadlineScheduler(lambda channel_id: cls.on_deadline(bot, channel_id),
+                                              config.autoclose['concurrency'],
+                                              config.autoclose['retry_minutes'] * 60)
+        semaphore = asyncio.Semaphore(config.autoclose['concurrency'])
+        results = await asyncio.gather(*(cls.check_guild(bot, guild, semaphore)
+                                         for guild in bot.guilds), return_exceptions=True)
+        for guild, result in zip(bot.guilds, results):
+            if isinstance(result, Exception):
+                log.error(f"AutoClose failed for {guild}",
+                          exc_info=result)
+        cls.scheduler.start()
+        log.info(f"AutoClose is tracking {len(cls.scheduler)} tickets")
 
+class ScrapeChallenges():
+    """Scrapes challenges"""
     @classmethod
     async def fetch_challenges(cls):
-        params = cls._setup()
-        async with aiohttp.ClientSession() as session:
-            return await cls._fetch(session, config.api["base_link"] +
-                                    '/challenges/released', params=params)
+        return await CTFApi.get('/challenges/released')
 
     @classmethod
     async def main(cls, bot: commands.Bot) -> None:
         challenges = await cls.fetch_challenges()
+        if not challenges:
+            log.warning("No challenges fetched, keeping the current challenges")
+            return
         all_challenges = []
         for challenge in challenges:
             ignore = bool(challenge['author'] == config.roles['admin'])
             all_challenges.append(Challenge(
                 challenge["id"], challenge["title"], challenge["author"], challenge["category"].split(",")[0], ignore))
 
-        db.refresh_database_ch(all_challenges)
+        await db.refresh_database_ch(all_challenges)
+        await ChallengeIndex.rebuild()
         await UpdateHelpers.main(bot)
 
+    @staticmethod
+    def _challenge_ids(solve_challenges) -> List[int]:
+        if not solve_challenges:
+            return []
+        return [challenge['challenge']['id'] for challenge in solve_challenges]
+
     @classmethod
-    async def get_user_challenges(cls, discord_id: int) -> List[int]:
-        params = cls._setup()
-        async with aiohttp.ClientSession() as session:
-            solve_challenges = await cls._fetch(session, config.api["base_link"] +
-                                                f'/solves/bydiscordid/{discord_id}', params=params)
+    async def get_user_challenges(cls, discord_id: int, limiter: RateLimiter = None,
+                                  teams: Dict[int, asyncio.Future] = None, strict: bool = False) -> List[int]:
+        """gets the challenges solved by a user's team, or by the user if they play solo
+
+        The team of a user is stored for config.api['team_ttl_seconds'],
+        so a known team member only needs the team solves request.
+
+        Parameters
+        ----------
+        discord_id : `int`
+            the user's discord id\n
+        limiter : `RateLimiter`, `optional`
+            paces the requests, by default None\n
+        teams : `Dict[int, asyncio.Future]`, `optional`
+            team solves requests by team id, shared so users of the same
+            team fetch them once, by default None\n
+        strict : `bool`, `optional`
+            raise if a request fails instead of treating it as no solves, by default False\n
+
+        Returns
+        -------
+        `List[int]`: the solved challenge ids
+
+        Raises
+        ------
+        `exceptions.APIError`: a request failed and strict is set
+        """
+        try:
+            team_id = await db.get_team(discord_id, time.time() - config.api['team_ttl_seconds'])
+        except ValueError:
+            solve_challenges = await CTFApi.get(f'/solves/bydiscordid/{discord_id}', limiter, strict)
             try:
                 team_id = solve_challenges[0]["team"]["id"]
-            except IndexError:  # one challenge
-                pass
-            except TypeError:  # solo player
-                pass
-            else:
-                solve_challenges = await cls._fetch(session, config.api["base_link"] +
-                                                    f'/solves/byteamid/{team_id}')
-            if not solve_challenges:
+            except IndexError:  # no solves yet
                 return []
-            return [challenge['challenge']['id'] for challenge in solve_challenges]
+            except TypeError:  # solo player
+                team_id = None
+            await db.set_teams({discord_id: team_id})
+            if team_id is None:
+                return cls._challenge_ids(solve_challenges)
+
+        if team_id is None:
+            return cls._challenge_ids(await CTFApi.get(f'/solves/bydiscordid/{discord_id}', limiter, strict))
+        if teams is None:
+            return cls._challenge_ids(await CTFApi.get(f'/solves/byteamid/{team_id}', limiter, strict))
+        if team_id not in teams:
+            teams[team_id] = asyncio.ensure_future(
+                CTFApi.get(f'/solves/byteamid/{team_id}', limiter, strict))
+        return cls._challenge_ids(await teams[team_id])
 
 class UpdateHelpers():
     @staticmethod
-    async def main(bot: commands.Bot):
-        for guild in bot.guilds:
-            helper_role = discord.utils.get(
-                guild.roles, name=config.roles['helper'])
-            for helper in helper_role.members:
-                solved_challenge_ids = await ScrapeChallenges.get_user_challenges(
-                    helper.id)
-                for ch_id in solved_challenge_ids:
-                    db.update_helper_ch(helper.id, ch_id)
+    async def main(bot: commands.Bot, full: bool = False):
+        """credit every helper with their solves, fetched concurrently
+        and written in one batch
+
+        Only solves that are not credited yet are written, the credits in
+        challenge_helpers are the cursor of each helper. A full sync fetches
+        every helper's solves live and replaces their credits, dropping the
+        ones that are no longer solved and those of members who are no
+        longer helpers.
+
+        Parameters
+        ----------
+        bot : `discord.commands.Bot`
+            the bot\n
+        full : `bool`, `optional`
+            replace every helper's credits, by default False\n
+        """
+        helper_ids = {helper.id for guild in bot.guilds
+                      if (helper_role := GuildCache.of(guild).role('helper')) is not None
+                      for helper in helper_role.members}
+        semaphore = asyncio.Semaphore(config.helper_sync['concurrency'])
+        limiter = RateLimiter(config.helper_sync['requests_per_second'])
+        teams: Dict[int, asyncio.Future] = {}
+
+        async def fetch_solves(helper_id: int) -> Tuple[int, Optional[List[int]]]:
+            async with semaphore:
+                try:
+                    return helper_id, await ScrapeChallenges.get_user_challenges(helper_id, limiter, teams, True)
+                except Exception:
+                    log.exception(f"Could not fetch the solves of helper {helper_id}")
+                    return helper_id, None
+
+        if full:
+            CTFApi.invalidate('/solves/')
+        fetched = await asyncio.gather(*(fetch_solves(helper_id) for helper_id in helper_ids))
+        # a failed fetch is not "no solves", those helpers keep their credits
+        solves = {helper_id: challenge_ids for helper_id, challenge_ids in fetched
+                  if challenge_ids is not None}
+        failed = [helper_id for helper_id, challenge_ids in fetched if challenge_ids is None]
+        if failed:
+            log.warning(f"Skipped {len(failed)} helpers whose solves could not be fetched: {failed}")
+        if full:
+            await db.replace_helpers_challenges(solves, helper_ids)
+            log.info(f"Re-synced the solves of {len(solves)} helpers")
+            return
+
+        credited = await db.get_helpers_challenges(list(solves))
+        new_solves = {helper_id: sorted(new) for helper_id, challenge_ids in solves.items()
+                      if (new := set(challenge_ids) - credited.get(helper_id, set()))}
+        if new_solves:
+            await db.add_helpers_challenges(new_solves)
+            log.info(
+                f"Credited {sum(map(len, new_solves.values()))} new solves to {len(new_solves)} helpers")
 
     @classmethod
     async def modify_helper_to_channel(cls, ticket_channel: discord.TextChannel, user_id: int, update: bool):
@@ -236,19 +458,15 @@ class UpdateHelpers():
     @classmethod
     async def modify_helpers_to_channel(cls, bot: commands.Bot, member_id: discord.Member.id = None, choice: types.HelperSync = 'ADD'):
         for guild in bot.guilds:
-            for channel_id in db.get_all_help_channels(guild.id):
+            tickets = await db.get_guild_tickets(guild.id, "help")
+            for channel_id, ticket in tickets.items():
                 if (channel_ := guild.get_channel(channel_id)):
                     try:
-                        helpers = db.get_helpers_from_title(
+                        helpers = await db.get_helpers_from_title(
                             channel_.topic.split(" - ")[0])
                     except AttributeError:
                         continue
 
-                    try:
-                        helpers = json.loads(helpers[0])
-                    except TypeError:
-                        continue
-
                     if not helpers:
                         await UI.log_to_logs(
                             "Challenge not found", channel_)
@@ -260,9 +478,6 @@ class UpdateHelpers():
                             await cls.modify_helper_to_channel(channel_, member_id, choice)
                         continue
                     for helper in helpers:
-                        try:
-                            if helper == db.get_user_id(channel_id):
-                                continue
-                        except ValueError:
-                            pass
+                        if helper == ticket.user_id:
+                            continue
                         await cls.modify_helper_to_channel(channel_, helper, choice)
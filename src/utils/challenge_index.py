@@ -0,0 +1,100 @@
+from typing import Dict, Iterable, List, Set
+import logging
+
+import discord
+
+from utils.database.db import AsyncDatabaseManager as db
+from utils.utility import Challenge
+
+log = logging.getLogger(__name__)
+
+class ChallengeIndex():
+    """The released challenges grouped by category, with their select options
+
+    Built from the database once and rebuilt only when ScrapeChallenges
+    refreshes the challenges, so picking a challenge for a ticket is a set
+    difference against the user's solves instead of a scan per solve.
+    """
+
+    challenges: Dict[int, Challenge] = {}
+    ids: Set[int] = set()
+    by_category: Dict[str, List[int]] = {}
+    _challenge_options: Dict[int, discord.SelectOption] = {}
+    _category_options: Dict[str, discord.SelectOption] = {}
+    _built = False
+
+    @staticmethod
+    def label(challenge: Challenge) -> str:
+        """select menu labels are capped at 25 characters"""
+        return (challenge.title[:23] + '..') if len(challenge.title) > 25 else challenge.title
+
+    @classmethod
+    def build(cls, challenges: Iterable[Challenge]):
+        """replaces the index
+
+        Parameters
+        ----------
+        challenges : `Iterable[Challenge]`
+            every released challenge, in database order\n
+        """
+        cls.challenges = {challenge.id: challenge for challenge in challenges}
+        cls.ids = set(cls.challenges)
+        cls.by_category = {}
+        for challenge in cls.challenges.values():
+            cls.by_category.setdefault(challenge.category, []).append(challenge.id)
+        cls._challenge_options = {
+            challenge.id: discord.SelectOption(label=cls.label(challenge), value=f"{challenge.id}")
+            for challenge in cls.challenges.values()}
+        cls._category_options = {
+            category: discord.SelectOption(label=category, value=category)
+            for category in cls.by_category}
+        cls._built = True
+
+    @classmethod
+    async def rebuild(cls):
+        """rebuilds the index from the challenges table"""
+        cls.build(Challenge(*list(challenge)) for challenge in await db.get_all_challenges())
+        log.info(f"Indexed {len(cls.ids)} challenges in {len(cls.by_category)} categories")
+
+    @classmethod
+    async def load(cls):
+        """builds the index from the database if it was never built"""
+        if not cls._built:
+            await cls.rebuild()
+
+    @classmethod
+    async def unsolved(cls, solved: Iterable[int]) -> Set[int]:
+        """ids of the challenges a user has not solved
+
+        Parameters
+        ----------
+        solved : `Iterable[int]`
+            ids of the challenges the user solved\n
+
+        Returns
+        -------
+        `Set[int]`: challenge ids
+        """
+        await cls.load()
+        return cls.ids.difference(solved)
+
+    @classmethod
+    def ordered(cls, ids: Set[int], reverse: bool = False) -> List[int]:
+        """the challenges in database order"""
+        order = reversed(cls.challenges) if reverse else cls.challenges
+        return [challenge_id for challenge_id in order if challenge_id in ids]
+
+    @classmethod
+    def in_category(cls, category: str, ids: Set[int]) -> List[int]:
+        return [challenge_id for challenge_id in cls.by_category.get(category, ())
+                if challenge_id in ids]
+
+    @classmethod
+    def challenge_options(cls, ids: Iterable[int]) -> List[discord.SelectOption]:
+        return [cls._challenge_options[challenge_id] for challenge_id in ids]
+
+    @classmethod
+    def category_options(cls, ids: Set[int]) -> List[discord.SelectOption]:
+        """options of the categories holding at least one of the challenges"""
+        return [option for category, option in cls._category_options.items()
+                if not ids.isdisjoint(cls.by_category[category])]
@@ -0,0 +1,146 @@
+import asyncio
+import typing
+from typing import Dict, List, Optional, Tuple
+import logging
+
+import discord
+
+import config
+from utils import types
+from utils.guild_cache import GuildCache, SHARD_SIZE
+from utils.options import Options
+
+log = logging.getLogger(__name__)
+
+class ChannelPool():
+    """Hidden ticket channels created ahead of time, per guild and ticket type
+
+    Claiming a pooled channel is a single edit of its name and overwrites
+    instead of a create, and the pool is refilled in the background, so a
+    burst of new tickets does not queue behind channel creation. Pooled
+    channels are found again by name after a restart.
+    """
+
+    _pools: Dict[Tuple[int, str], List[discord.TextChannel]] = {}
+    _refills: Dict[Tuple[int, str], asyncio.Task] = {}
+
+    @staticmethod
+    def size(ticket_type: types.TicketType) -> int:
+        return config.channel_pool['size'].get(ticket_type, 0)
+
+    @staticmethod
+    def pool_name(ticket_type: types.TicketType) -> str:
+        return f"{config.channel_pool['name']}-{ticket_type}"
+
+    @classmethod
+    def is_pooled(cls, channel: discord.abc.GuildChannel) -> bool:
+        return any(channel in pool for (guild_id, _), pool in cls._pools.items()
+                   if guild_id == channel.guild.id)
+
+    @classmethod
+    def discard(cls, channel: discord.abc.GuildChannel):
+        """forgets a pooled channel, e.g. after it was deleted
+
+        Parameters
+        ----------
+        channel : `discord.abc.GuildChannel`
+            the channel\n
+        """
+        for (guild_id, _), pool in cls._pools.items():
+            if guild_id == channel.guild.id and channel in pool:
+                pool.remove(channel)
+
+    @classmethod
+    async def claim(cls, guild: discord.Guild, ticket_type: types.TicketType,
+                    name: str, overwrites: dict) -> Optional[discord.TextChannel]:
+        """turns a pooled channel into a ticket channel
+
+        Parameters
+        ----------
+        guild : `discord.Guild`
+            the guild\n
+        ticket_type : `types.TicketType`
+            type of ticket\n
+        name : `str`
+            name of the ticket channel\n
+        overwrites : `dict`
+            permission overwrites of the ticket channel\n
+
+        Returns
+        -------
+        `Optional[discord.TextChannel]`: the ticket channel, None if the pool is empty
+        """
+        pool = cls._pools.get((guild.id, ticket_type), [])
+        channel = None
+        while pool and channel is None:
+            candidate = pool.pop()
+            if guild.get_channel(candidate.id) is not None:
+                channel = candidate
+        if cls.size(ticket_type):
+            cls.refill(guild, ticket_type)
+        if channel is None:
+            return None
+        try:
+            return await channel.edit(name=name, overwrites=overwrites) or channel
+        except discord.HTTPException:
+            log.exception(f"Could not claim pooled channel {channel} in {guild}")
+            return None
+
+    @classmethod
+    def refill(cls, guild: discord.Guild, ticket_type: types.TicketType):
+        """tops up the pool in the background, once at a time per pool
+
+        Parameters
+        ----------
+        guild : `discord.Guild`
+            the guild\n
+        ticket_type : `types.TicketType`
+            type of ticket\n
+        """
+        key = (guild.id, ticket_type)
+        task = cls._refills.get(key)
+        if task is None or task.done():
+            cls._refills[key] = asyncio.get_event_loop().create_task(
+                cls._fill(guild, ticket_type))
+
+    @classmethod
+    async def _fill(cls, guild: discord.Guild, ticket_type: types.TicketType):
+        pool = cls._pools.setdefault((guild.id, ticket_type), [])
+        overwrites = {
+            guild.default_role: discord.PermissionOverwrite(read_messages=False),
+            guild.me: discord.PermissionOverwrite(read_messages=True)
+        }
+        cache = GuildCache.of(guild)
+        try:
+            while len(pool) < cls.size(ticket_type):
+                async with cache.shard_lock(Options.full_category_name(ticket_type)):
+                    # pooled channels never open a new shard
+                    category = next((category for category in cache.ticket_categories(ticket_type)
+                                     if cache.shard_size(category) < SHARD_SIZE), None)
+                    if category is None:
+                        break
+                    channel = await category.create_text_channel(
+                        cls.pool_name(ticket_type), overwrites=overwrites)
+                    cache.place(category, channel.id)
+                pool.append(channel)
+        except discord.HTTPException:
+            log.exception(f"Could not refill the {ticket_type} pool of {guild}")
+
+    @classmethod
+    def start(cls, guild: discord.Guild):
+        """adopts the pooled channels left from a previous run and fills every pool
+
+        Parameters
+        ----------
+        guild : `discord.Guild`
+            the guild\n
+        """
+        cache = GuildCache.of(guild)
+        for ticket_type in typing.get_args(types.TicketType):
+            if not cls.size(ticket_type):
+                continue
+            pool = cls._pools.setdefault((guild.id, ticket_type), [])
+            pool[:] = [channel for category in cache.ticket_categories(ticket_type)
+                       for channel in category.text_channels
+                       if channel.name == cls.pool_name(ticket_type)]
+            cls.refill(guild, ticket_type)
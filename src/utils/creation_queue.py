@@ -0,0 +1,121 @@
+import asyncio
+from collections import OrderedDict, deque
+from typing import Awaitable, Callable, Deque, Dict, List, NamedTuple
+import logging
+
+import discord
+
+import config
+from utils import exceptions
+
+log = logging.getLogger(__name__)
+
+class _Job(NamedTuple):
+    create: Callable[[], Awaitable]
+    future: asyncio.Future
+
+class CreationQueue():
+    """Runs the ticket channel creations of a guild through a bounded queue
+
+    A fixed number of workers per guild take jobs round robin between users,
+    so one user clicking repeatedly does not hold back everyone else, and a
+    spike beyond config.creation_queue['max_pending'] is turned away instead
+    of hitting Discord's rate limits all at once.
+    """
+
+    _queues: Dict[int, "CreationQueue"] = {}
+
+    def __init__(self):
+        self._pending: "OrderedDict[int, Deque[_Job]]" = OrderedDict()
+        self._size = 0
+        self._jobs = asyncio.Semaphore(0)
+        self._workers: List[asyncio.Task] = []
+
+    @classmethod
+    def of(cls, guild: discord.Guild) -> "CreationQueue":
+        """gets the queue of a guild
+
+        Parameters
+        ----------
+        guild : `discord.Guild`
+            the guild\n
+
+        Returns
+        -------
+        `CreationQueue`: the guild's queue
+        """
+        if guild.id not in cls._queues:
+            cls._queues[guild.id] = cls()
+        return cls._queues[guild.id]
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _position(self, user_id: int) -> int:
+        """where a new job of a user lands, counting the jobs served before it"""
+        own = len(self._pending.get(user_id, ()))
+        ahead = own
+        before = True
+        for other, jobs in self._pending.items():
+            if other == user_id:
+                before = False
+                continue
+            ahead += min(len(jobs), own + 1 if before else own)
+        return ahead + 1
+
+    async def run(self, user_id: int, create: Callable[[], Awaitable],
+                  notify: Callable[[int], Awaitable] = None):
+        """queues a creation and waits for its result
+
+        Parameters
+        ----------
+        user_id : `int`
+            the user the ticket is created for\n
+        create : `Callable[[], Awaitable]`
+            the creation to run\n
+        notify : `Callable[[int], Awaitable]`, `optional`
+            called with the position in the queue right after queueing, by default None\n
+
+        Raises
+        ------
+        `exceptions.CreationQueueFull`: the guild already has too many pending creations
+        """
+        if self._size >= config.creation_queue['max_pending']:
+            raise exceptions.CreationQueueFull
+        self._start()
+        position = self._position(user_id)
+        job = _Job(create, asyncio.get_event_loop().create_future())
+        self._pending.setdefault(user_id, deque()).append(job)
+        self._size += 1
+        self._jobs.release()
+        if notify is not None:
+            try:
+                await notify(position)
+            except discord.HTTPException:
+                log.warning(f"Could not tell user {user_id} their position {position}")
+        return await job.future
+
+    def _next(self) -> _Job:
+        user_id, jobs = self._pending.popitem(last=False)
+        job = jobs.popleft()
+        if jobs:
+            self._pending[user_id] = jobs
+        self._size -= 1
+        return job
+
+    def _start(self):
+        self._workers = [worker for worker in self._workers if not worker.done()]
+        while len(self._workers) < config.creation_queue['workers']:
+            self._workers.append(asyncio.get_event_loop().create_task(self._work()))
+
+    async def _work(self):
+        while True:
+            await self._jobs.acquire()
+            job = self._next()
+            if job.future.cancelled():
+                continue
+            try:
+                job.future.set_result(await job.create())
+            except Exception as e:
+                if not job.future.cancelled():
+                    job.future.set_exception(e)
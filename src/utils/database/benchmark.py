@@ -0,0 +1,325 @@
+"""DatabaseManager micro-benchmarks
+
+Builds a throwaway database with season-sized volumes, times every public
+DatabaseManager method and writes a JSON report that can be compared
+against a stored baseline. Run from src/:
+
+    python -m utils.database.benchmark --output report.json
+    python -m utils.database.benchmark --baseline report.json
+"""
+import os
+import sys
+import json
+import time
+import random
+import inspect
+import argparse
+import platform
+import sqlite3
+import tempfile
+import statistics
+from typing import Callable, Dict, List, NamedTuple, Tuple
+
+import config
+from utils.database.db import DatabaseManager as db
+from utils.database.maintenance import DISCORD_EPOCH_MS
+from utils.utility import Challenge
+
+GUILD_IDS = [1000, 2000]
+TICKET_COLUMNS = "channel_id, channel_name, guild_id, user_id, t_type, status, bg_check"
+TICKET_TYPES = ["help", "submit", "misc"]
+CATEGORIES = ["Crypto", "Web", "Pwn", "Rev", "Misc", "Forensics"]
+
+class Volumes(NamedTuple):
+    archived: int = 200_000
+    open: int = 2_000
+    challenges: int = 500
+    helpers: int = 200
+
+class Case(NamedTuple):
+    name: str
+    call: Callable
+    setup: Callable[[int], Tuple] = lambda i: ()
+    # drop the ticket record cache before every call to time the query itself
+    cold: bool = False
+    runs: int = None
+
+def _snowflake(days_ago: float) -> int:
+    ms = int((time.time() - days_ago * 86400) * 1000)
+    return (ms - DISCORD_EPOCH_MS) << 22
+
+def build_fixture(path: str, volumes: Volumes, seed: int = 0):
+    """fills a new database with synthetic tickets, challenges and helpers
+
+    Parameters
+    ----------
+    path : `str`
+        database file to create\n
+    volumes : `Volumes`
+        number of rows to create\n
+    seed : `int`, `optional`
+        random seed, by default 0\n
+    """
+    rng = random.Random(seed)
+    conn = db.connect(path)
+
+    def ticket(channel_id, status):
+        t_type = rng.choice(TICKET_TYPES)
+        return (channel_id, f"{t_type}-user{channel_id % 997}-{channel_id % 10000}",
+                rng.choice(GUILD_IDS), str(rng.randrange(10 ** 17, 10 ** 18)),
+                t_type, status, rng.choice([0, 1, 2]))
+
+    archived = [ticket(_snowflake(rng.uniform(1, 730)), "closed")
+                for _ in range(volumes.archived)]
+    open_tickets = [ticket(_snowflake(rng.uniform(0, 30)), rng.choice(["open", "open", "closed"]))
+                    for _ in range(volumes.open)]
+    challenges = [(id_, f"challenge-{id_}", f"author{id_ % 40}", rng.choice(CATEGORIES), id_ % 10 == 0)
+                  for id_ in range(1, volumes.challenges + 1)]
+    helpers = [(10 ** 17 + id_, rng.choice([0, 1])) for id_ in range(volumes.helpers)]
+    solves = {(challenge[0], helper[0]) for helper in helpers
+              for challenge in rng.sample(challenges, k=min(len(challenges), rng.randrange(20, 200)))}
+
+    with db._transaction() as cur:
+        cur.executemany(
+            f"INSERT INTO archive({TICKET_COLUMNS}) VALUES ($1,$2,$3,$4,$5,$6,$7)", archived)
+        cur.executemany(
+            f"INSERT INTO requests({TICKET_COLUMNS}) VALUES ($1,$2,$3,$4,$5,$6,$7)", open_tickets)
+        cur.executemany(
+            "INSERT INTO challenges(id, title, author, category, ignore) VALUES ($1,$2,$3,$4,$5)", challenges)
+        cur.executemany("INSERT INTO helpers VALUES ($1,$2)", helpers)
+        cur.executemany(
+            "INSERT INTO challenge_helpers(challenge_id, helper_id) VALUES ($1,$2)", solves)
+        cur.execute("""
+        INSERT OR REPLACE INTO ticket_counters(guild_id, t_type, next_number)
+        SELECT guild_id, t_type, count(1) FROM
+        (SELECT channel_id, guild_id, t_type FROM requests
+        UNION SELECT channel_id, guild_id, t_type FROM archive)
+        GROUP BY guild_id, t_type""")
+    conn.execute("ANALYZE")
+
+def cases(seed: int = 0) -> List[Case]:
+    """the benchmark cases, at least one per public DatabaseManager method"""
+    rng = random.Random(seed)
+    open_ids = [row[0] for row in db._raw_select("SELECT channel_id FROM requests")]
+    user_ids = [int(row[0]) for row in db._raw_select("SELECT user_id FROM requests")]
+    helper_ids = db.get_all_helpers()[::2]
+    challenges = [Challenge(*row) for row in db.get_all_challenges()]
+    new_id = iter(range(_snowflake(-1), _snowflake(-1) + 10 ** 9))
+
+    def any_open(_):
+        return (rng.choice(open_ids),)
+
+    def cached_open(_):
+        args = any_open(_)
+        db.get_ticket(*args)
+        return args
+
+    def new_ticket(_):
+        channel_id = next(new_id)
+        return (channel_id, f"help-bench-{channel_id % 1000}", rng.choice(GUILD_IDS),
+                rng.choice(user_ids), "help", "open", "0")
+
+    def created_ticket(_):
+        args = new_ticket(_)
+        db.create_ticket(*args)
+        return (args[0],)
+
+    def refreshed(_):
+        changed = [ch._replace(title=f"{ch.title}*") if rng.random() < .05 else ch
+                   for ch in challenges]
+        return (changed,)
+
+    return [
+        Case("create_ticket", db.create_ticket, new_ticket),
+        Case("update_ticket_name", lambda id_: db.update_ticket_name(
+            "help-closed-bench", id_), any_open),
+        Case("move_ticket_to_archive", db.move_ticket_to_archive, created_ticket),
+        Case("delete_ticket", db.delete_ticket, created_ticket),
+        Case("get_ticket", db.get_ticket, any_open, cold=True),
+        Case("get_ticket[cached]", db.get_ticket, cached_open),
+        Case("get_tickets[50]", db.get_tickets,
+             lambda _: (rng.sample(open_ids, 50),), cold=True),
+        Case("get_guild_tickets", db.get_guild_tickets,
+             lambda _: (rng.choice(GUILD_IDS), "help"), cold=True),
+        Case("get_user_id", db.get_user_id, any_open, cold=True),
+        Case("get_all_help_channels", db.get_all_help_channels,
+             lambda _: (rng.choice(GUILD_IDS),)),
+        Case("get_status", db.get_status, any_open, cold=True),
+        Case("get_user_open_tickets", db.get_user_open_tickets,
+             lambda _: (rng.choice(TICKET_TYPES), rng.choice(user_ids))),
+        Case("get_number_new", db.get_number_new,
+             lambda _: (rng.choice(TICKET_TYPES), rng.choice(GUILD_IDS))),
+        Case("reserve_number", db.reserve_number,
+             lambda _: (rng.choice(TICKET_TYPES), rng.choice(GUILD_IDS))),
+        Case("get_number_previous", db.get_number_previous, any_open, cold=True),
+        Case("get_ticket_type", db.get_ticket_type, any_open, cold=True),
+        Case("get_channel_name", db.get_channel_name, any_open, cold=True),
+        Case("update_status", lambda id_: db.update_status(
+            "open", id_), any_open),
+        Case("get_check", db.get_check, any_open, cold=True),
+        Case("update_check", lambda id_: db.update_check("0", id_), any_open),
+        Case("update_activity", lambda id_: db.update_activity(
+            id_, time.time(), rng.choice(user_ids)), any_open),
+        Case("get_guild_safe_tickets", db.get_guild_safe_tickets,
+             lambda _: (rng.choice(GUILD_IDS),)),
+        Case("get_all_challenges", db.get_all_challenges),
+        Case("get_challenge_from_id", db.get_challenge_from_id,
+             lambda _: (rng.choice(challenges).id,)),
+        Case("get_helpers_from_title", db.get_helpers_from_title,
+             lambda _: (rng.choice(challenges).title,)),
+        Case("get_challenge_helpers", db.get_challenge_helpers,
+             lambda _: (rng.choice(challenges).id,)),
+        Case("get_available_challenge_helpers", db.get_available_challenge_helpers,
+             lambda _: (rng.choice(challenges).id,)),
+        Case("get_helper_challenges", db.get_helper_challenges,
+             lambda _: (rng.choice(helper_ids),)),
+        Case("refresh_database_ch", db.refresh_database_ch, refreshed, runs=5),
+        Case("create_helper", db.create_helper,
+             lambda i: (10 ** 16 + i,)),
+        Case("get_helper_status", db.get_helper_status,
+             lambda _: (rng.choice(helper_ids),)),
+        Case("get_all_helpers", db.get_all_helpers),
+        Case("delete_helper", db.delete_helper,
+             lambda i: (10 ** 16 + i,)),
+        Case("update_helper_status", db.update_helper_status,
+             lambda _: (rng.choice(helper_ids), rng.choice([0, 1]))),
+        Case("add_helper_challenges", db.add_helper_challenges,
+             lambda _: (rng.choice(helper_ids), [ch.id for ch in rng.sample(challenges, 100)])),
+        Case("get_helpers_challenges", db.get_helpers_challenges,
+             lambda _: (rng.sample(helper_ids, 50),)),
+        Case("replace_helpers_challenges", db.replace_helpers_challenges,
+             lambda _: ({helper_id: [ch.id for ch in rng.sample(challenges, 100)]
+                         for helper_id in rng.sample(helper_ids, 20)},), runs=20),
+        Case("set_teams", db.set_teams,
+             lambda i: ({helper_ids[i % len(helper_ids)]: rng.choice([None, i])},)),
+        Case("get_team", db.get_team,
+             lambda i: (helper_ids[i % len(helper_ids)],)),
+        Case("add_helpers_challenges", db.add_helpers_challenges,
+             lambda _: ({helper_id: [ch.id for ch in rng.sample(challenges, 100)]
+                         for helper_id in rng.sample(helper_ids, 20)},), runs=20),
+        # last, it prunes the archive the other cases read from
+        Case("run_maintenance", db.run_maintenance, runs=1),
+    ]
+
+def time_case(case: Case, runs: int) -> Dict[str, float]:
+    """times a case
+
+    Returns
+    -------
+    `Dict[str, float]`: run count and timings in microseconds
+    """
+    timings = []
+    for i in range(case.runs or runs):
+        args = case.setup(i)
+        if case.cold:
+            db._tickets.clear()
+        start = time.perf_counter()
+        case.call(*args)
+        timings.append((time.perf_counter() - start) * 1e6)
+    return {"runs": len(timings),
+            "median_us": round(statistics.median(timings), 2),
+            "mean_us": round(statistics.fmean(timings), 2),
+            "min_us": round(min(timings), 2),
+            "max_us": round(max(timings), 2)}
+
+def untimed_methods(all_cases: List[Case]) -> List[str]:
+    """public DatabaseManager methods without a benchmark case"""
+    timed = {case.name.split("[")[0] for case in all_cases}
+    lifecycle = {"connect", "close"}
+    return sorted(name for name, _ in inspect.getmembers(db, inspect.ismethod)
+                  if not name.startswith("_") and name not in timed | lifecycle)
+
+def run(volumes: Volumes, runs: int, seed: int = 0) -> Dict:
+    """builds the fixture in a temporary directory and times every case
+
+    Returns
+    -------
+    `Dict`: the report
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        config.database['archive_export_dir'] = os.path.join(tmp, "exports")
+        start = time.perf_counter()
+        build_fixture(os.path.join(tmp, "bench.db"), volumes, seed)
+        fixture_seconds = time.perf_counter() - start
+        try:
+            all_cases = cases(seed)
+            results = {case.name: time_case(case, runs) for case in all_cases}
+            untimed = untimed_methods(all_cases)
+        finally:
+            db.close()
+    return {"meta": {"volumes": volumes._asdict(),
+                     "runs": runs,
+                     "seed": seed,
+                     "fixture_seconds": round(fixture_seconds, 2),
+                     "python": platform.python_version(),
+                     "sqlite": sqlite3.sqlite_version,
+                     "platform": platform.platform(),
+                     "untimed": untimed},
+            "results": results}
+
+def compare(report: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """compares the medians of a report against a baseline report
+
+    Parameters
+    ----------
+    report : `Dict`
+        the new report\n
+    baseline : `Dict`
+        the stored report\n
+    tolerance : `float`
+        allowed relative slowdown, 0.2 allows 20% slower medians\n
+
+    Returns
+    -------
+    `List[str]`: the regressions
+    """
+    regressions = []
+    for name, result in report["results"].items():
+        if (old := baseline["results"].get(name)) is None:
+            print(f"{name:32} {result['median_us']:>12.1f}us  (new)")
+            continue
+        ratio = result["median_us"] / max(old["median_us"], 0.01)
+        flag = ""
+        if ratio > 1 + tolerance:
+            flag = "  REGRESSION"
+            regressions.append(f"{name}: {old['median_us']}us -> {result['median_us']}us")
+        print(f"{name:32} {result['median_us']:>12.1f}us  x{ratio:.2f}{flag}")
+    return regressions
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    defaults = Volumes()
+    parser.add_argument("--archived", type=int, default=defaults.archived)
+    parser.add_argument("--open", type=int, default=defaults.open)
+    parser.add_argument("--challenges", type=int, default=defaults.challenges)
+    parser.add_argument("--helpers", type=int, default=defaults.helpers)
+    parser.add_argument("--runs", type=int, default=200,
+                        help="calls per method")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the JSON report here")
+    parser.add_argument("--baseline", help="JSON report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="allowed relative slowdown before failing")
+    args = parser.parse_args(argv)
+
+    volumes = Volumes(args.archived, args.open, args.challenges, args.helpers)
+    report = run(volumes, args.runs, args.seed)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2)
+    if report["meta"]["untimed"]:
+        print(f"untimed methods: {', '.join(report['meta']['untimed'])}")
+
+    if not args.baseline:
+        for name, result in report["results"].items():
+            print(f"{name:32} {result['median_us']:>12.1f}us")
+        return 0
+    with open(args.baseline, encoding="utf-8") as file:
+        regressions = compare(report, json.load(file), args.tolerance)
+    for regression in regressions:
+        print(f"regression: {regression}")
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,39 +1,129 @@
+import time
 import sqlite3
-import json
+import threading
+import asyncio
+import functools
+import inspect
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from itertools import chain
-from typing import Union, List
+from typing import Iterable, Union, List, Optional, Dict, Set
 import logging
 
 from utils import types
-from utils.utility import Challenge
+from utils.utility import Challenge, TicketRecord
 from utils import exceptions
+from utils.database.migrations import migrate
+from utils.database import maintenance
+import config
 
 log = logging.getLogger(__name__)
 
+TICKET_COLUMNS = """channel_id, channel_name, guild_id, user_id, t_type, status, bg_check,
+last_activity, last_author_id"""
+
 class DatabaseManager():
     """Database Actions"""
 
+    _conn: Optional[sqlite3.Connection] = None
+    _lock = threading.RLock()
+    # write-through cache of requests rows, keyed by channel_id
+    _tickets: Dict[int, TicketRecord] = {}
+
+    @classmethod
+    def connect(cls, path: str = None) -> sqlite3.Connection:
+        """opens the long-lived connection used by every query
+
+        Parameters
+        ----------
+        path : `str`, `optional`
+            database file, by default config.database['path']\n
+
+        Returns
+        -------
+        `sqlite3.Connection`: the shared connection
+        """
+        with cls._lock:
+            if cls._conn is not None:
+                return cls._conn
+            conn = sqlite3.connect(path or config.database['path'],
+                                   check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            # only takes effect on new databases, maintenance converts old ones
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute(
+                f"PRAGMA synchronous = {config.database['synchronous']}")
+            # negative cache_size is in KiB rather than pages
+            conn.execute(
+                f"PRAGMA cache_size = -{int(config.database['cache_size_kib'])}")
+            conn.execute(
+                f"PRAGMA mmap_size = {int(config.database['mmap_size'])}")
+            conn.execute("PRAGMA temp_store = MEMORY")
+            conn.execute("PRAGMA foreign_keys = ON")
+            migrate(conn)
+            cls._conn = conn
+            log.info(f"Opened database {path or config.database['path']}")
+            return conn
+
+    @classmethod
+    def close(cls):
+        """optimizes and closes the shared connection"""
+        with cls._lock:
+            if cls._conn is None:
+                return
+            try:
+                cls._conn.execute("PRAGMA optimize")
+            except sqlite3.Error as e:
+                log.exception(e)
+            cls._conn.close()
+            cls._conn = None
+            cls._tickets.clear()
+            log.info("Closed database")
+
+    @classmethod
+    def run_maintenance(cls) -> maintenance.MaintenanceReport:
+        """exports old archived tickets and compacts the database,
+        configured by config.database
+
+        Returns
+        -------
+        `maintenance.MaintenanceReport`: what was exported and how much space was reclaimed
+        """
+        conn = cls._db_connect()
+        with cls._lock:
+            return maintenance.run(conn, config.database['archive_max_age_days'],
+                                   config.database['archive_export_dir'],
+                                   config.database['archive_season_format'])
+
     @classmethod
     def _db_connect(cls) -> Union[sqlite3.Connection, None]:
+        if cls._conn is not None:
+            return cls._conn
         try:
-            conn = sqlite3.connect('utils/database/bot.db')
-            conn.row_factory = sqlite3.Row
+            return cls.connect()
         except Exception as e:
             log.exception(e)
             return None
-        return conn
 
     @classmethod
-    def _raw_insert(cls, query: str, *values):
+    def _raw_insert(cls, query: str, *values) -> bool:
         conn = cls._db_connect()
-        cur = conn.cursor()
         try:
-            with conn:
-                cur.execute(query, *values)
+            with cls._lock, conn:
+                conn.execute(query, *values)
         except Exception as e:
             log.exception(str(e))
-        finally:
-            conn.close()
+            return False
+        return True
+
+    @classmethod
+    @contextmanager
+    def _transaction(cls):
+        """runs the enclosed statements in one transaction, rolling back on error"""
+        conn = cls._db_connect()
+        with cls._lock, conn:
+            yield conn.cursor()
 
     @classmethod
     def _raw_update(cls, query: str, *values):
@@ -46,11 +136,10 @@ class DatabaseManager():
     @classmethod
     def _raw_select(cls, query: str, *values, fetch_one: bool = False, fetch_all: bool = True) -> Union[sqlite3.Row, list]:
         conn = cls._db_connect()
-        cur = conn.cursor()
         ret = []
         try:
-            with conn:
-                cur.execute(query, *values)
+            with cls._lock:
+                cur = conn.execute(query, *values)
                 if fetch_one:
                     ret = cur.fetchone()
                 elif fetch_all:
@@ -59,8 +148,6 @@ class DatabaseManager():
                     ret = cur.fetchall()
         except Exception as e:
             log.exception(str(e))
-        finally:
-            conn.close()
         return ret
 
     @classmethod
@@ -89,7 +176,9 @@ class DatabaseManager():
         VALUES ($1,$2,$3,$4,$5,$6,$8 )"""
         values = (channel_id, channel_name, guild_id,
                   user_id, t_type, status, bg_check,)
-        cls._raw_insert(query, values)
+        with cls._lock:
+            if cls._raw_insert(query, values):
+                cls._tickets[channel_id] = TicketRecord(*values)
 
     @classmethod
     def update_ticket_name(cls, channel_name: str, channel_id: int):
@@ -106,7 +195,9 @@ class DatabaseManager():
         UPDATE requests 
         SET channel_name = $1 WHERE channel_id = $2"""
         values = (channel_name, channel_id,)
-        cls._raw_update(query, values)
+        with cls._lock:
+            if cls._raw_update(query, values) and channel_id in cls._tickets:
+                cls._tickets[channel_id].channel_name = channel_name
 
     @classmethod
     def delete_ticket(cls, channel_id: int):
@@ -122,7 +213,9 @@ class DatabaseManager():
         WHERE channel_id = $1
         """
         values = (channel_id,)
-        cls._raw_delete(query, values)
+        with cls._lock:
+            if cls._raw_delete(query, values):
+                cls._tickets.pop(channel_id, None)
 
     @classmethod
     def move_ticket_to_archive(cls, channel_id: int):
@@ -139,7 +232,95 @@ class DatabaseManager():
         WHERE channel_id = $1
         """
         values = (channel_id,)
-        cls._raw_insert(query, values)
+        with cls._lock:
+            if cls._raw_insert(query, values):
+                cls._tickets.pop(channel_id, None)
+
+    @classmethod
+    def get_ticket(cls, channel_id: int) -> TicketRecord:
+        """gets the full ticket record of a channel, from the cache if possible
+
+        Parameters
+        ----------
+        channel_id : `int`
+            the channel id\n
+
+        Returns
+        -------
+        `TicketRecord`: the ticket
+        """
+        with cls._lock:
+            if (ticket := cls._tickets.get(channel_id)) is not None:
+                return ticket
+            query = f"""
+            SELECT {TICKET_COLUMNS}
+            FROM requests WHERE channel_id = $1"""
+            values = (channel_id,)
+            row = cls._raw_select(query, values, fetch_one=True)
+            if not row:
+                raise ValueError(
+                    f"No channel exists with id {channel_id}")
+            ticket = cls._tickets[channel_id] = TicketRecord(*row)
+            return ticket
+
+    @classmethod
+    def get_tickets(cls, channel_ids: List[int]) -> Dict[int, TicketRecord]:
+        """gets the ticket records of many channels at once,
+        channels without a ticket are left out
+
+        Parameters
+        ----------
+        channel_ids : `List[int]`
+            the channel ids\n
+
+        Returns
+        -------
+        `Dict[int, TicketRecord]`: ticket records by channel id
+        """
+        with cls._lock:
+            tickets = {channel_id: cls._tickets[channel_id]
+                       for channel_id in channel_ids if channel_id in cls._tickets}
+            missing = list({channel_id for channel_id in channel_ids
+                            if channel_id not in tickets})
+            # stay below SQLite's bound parameter limit
+            for i in range(0, len(missing), 500):
+                chunk = missing[i:i + 500]
+                query = f"""
+                SELECT {TICKET_COLUMNS}
+                FROM requests WHERE channel_id IN ({','.join('?' * len(chunk))})"""
+                for row in cls._raw_select(query, chunk):
+                    ticket = cls._tickets[row[0]] = TicketRecord(*row)
+                    tickets[ticket.channel_id] = ticket
+            return tickets
+
+    @classmethod
+    def get_guild_tickets(cls, guild_id: int, t_type: types.TicketType = None) -> Dict[int, TicketRecord]:
+        """gets the ticket records of every ticket in a guild
+
+        Parameters
+        ----------
+        guild_id : `int`
+            the guild id\n
+        t_type : `types.TicketType`, `optional`
+            only get tickets of this type, by default all types\n
+
+        Returns
+        -------
+        `Dict[int, TicketRecord]`: ticket records by channel id
+        """
+        query = f"""
+        SELECT {TICKET_COLUMNS}
+        FROM requests WHERE guild_id = $1"""
+        values = (guild_id,)
+        if t_type is not None:
+            query += " AND t_type = $2"
+            values = (guild_id, t_type,)
+        with cls._lock:
+            tickets = {}
+            for row in cls._raw_select(query, values):
+                ticket = cls._tickets.setdefault(row[0], TicketRecord(*row))
+                tickets[ticket.channel_id] = ticket
+            return tickets
 
     @classmethod
     def get_user_id(cls, channel_id: int) -> Union[int, None]:
@@ -154,17 +335,7 @@ class DatabaseManager():
         -------
         `int`: the user's id
         """
-
-        query = """
-        SELECT user_id FROM requests
-        WHERE channel_id = $1"""
-        values = (channel_id,)
-        user_id = cls._raw_select(query, values, fetch_one=True)
-        try:
-            return int(user_id[0])
-        except TypeError as e:
-            raise ValueError(
-                f"No channel exists with id {channel_id}") from e
+        return cls.get_ticket(channel_id).user_id
 
     @classmethod
     def get_all_help_channels(cls, guild_id: int) -> List[int]:
@@ -199,16 +370,7 @@ class DatabaseManager():
         -------
         `str`: the channel's status
         """
-        query = """
-        SELECT status FROM requests
-        WHERE channel_id = $1"""
-        values = (channel_id,)
-        status = cls._raw_select(query, values, fetch_one=True)
-        try:
-            return status[0]
-        except TypeError as e:
-            raise ValueError(
-                f"No channel exists with id {channel_id}") from e
+        return cls.get_ticket(channel_id).status
 
     @classmethod
     def get_user_open_tickets(cls, t_type: types.TicketType, user_id: int):
@@ -235,24 +397,53 @@ class DatabaseManager():
 
     @classmethod
     def get_number_new(cls, t_type: types.TicketType, guild_id: int) -> int:
-        """gets the number of tickets of that ticket type
+        """gets the number the next ticket of that ticket type will get
 
         Parameters
         ----------
         t_type : `types.TicketType`
             type of ticket\n
+        guild_id : `int`
+            the guild id\n
 
         Returns
         -------
         `int`: new number
         """
         query = """
-        SELECT count(1) FROM
-        (SELECT * FROM requests WHERE t_type=$1 AND guild_id = $2
-        union SELECT * FROM archive WHERE t_type=$1 AND guild_id = $2)"""
-        values = (t_type, guild_id,)
+        SELECT next_number FROM ticket_counters
+        WHERE guild_id = $1 AND t_type = $2"""
+        values = (guild_id, t_type,)
         ret = cls._raw_select(query, values, fetch_one=True)
-        return int(ret[0])
+        return int(ret[0]) if ret else 0
+
+    @classmethod
+    def reserve_number(cls, t_type: types.TicketType, guild_id: int) -> int:
+        """atomically takes the next ticket number of that ticket type,
+        so concurrent ticket creations never share a number
+
+        Parameters
+        ----------
+        t_type : `types.TicketType`
+            type of ticket\n
+        guild_id : `int`
+            the guild id\n
+
+        Returns
+        -------
+        `int`: the reserved number
+        """
+        upsert_query = """
+        INSERT INTO ticket_counters(guild_id, t_type, next_number)
+        VALUES($1,$2,1)
+        ON CONFLICT(guild_id, t_type) DO UPDATE SET next_number = next_number + 1"""
+        select_query = """
+        SELECT next_number FROM ticket_counters
+        WHERE guild_id = $1 AND t_type = $2"""
+        values = (guild_id, t_type,)
+        with cls._transaction() as cur:
+            cur.execute(upsert_query, values)
+            return int(cur.execute(select_query, values).fetchone()[0]) - 1
 
     @classmethod
     def get_number_previous(cls, channel_id: int) -> str:
@@ -267,18 +458,7 @@ class DatabaseManager():
         -------
         `str`: previous number
         """
-        query = """
-        SELECT channel_name FROM requests 
-        WHERE channel_id = $1"""
-        values = (channel_id,)
-        db_channel_name_str = cls._raw_select(query, values, fetch_one=True)
-        try:
-            db_channel_name = db_channel_name_str[0].lower()
-        except TypeError as e:
-            raise ValueError(
-                f"No channel exists with id {channel_id}") from e
-        number = db_channel_name.split("-")[-1]
-        return number
+        return cls.get_ticket(channel_id).number
 
     @classmethod
     def get_ticket_type(cls, channel_id: int) -> types.TicketType:
@@ -292,16 +472,7 @@ class DatabaseManager():
         -------
         `types.TicketType`: ticket type
         """
-        query = """
-        SELECT t_type FROM requests 
-        WHERE channel_id = $1"""
-        values = (channel_id,)
-        t_type = cls._raw_select(query, values, fetch_one=True)
-        try:
-            return t_type[0]
-        except TypeError as e:
-            raise ValueError(
-                f"No channel exists with id {channel_id}") from e
+        return cls.get_ticket(channel_id).t_type
 
     @classmethod
     def get_channel_name(cls, channel_id: int) -> str:
@@ -315,16 +486,7 @@ class DatabaseManager():
         -------
         `str`: the channel name
         """
-        query = """
-        SELECT channel_name FROM requests 
-        WHERE channel_id = $1"""
-        values = (channel_id,)
-        db_channel_name_str = cls._raw_select(query, values, fetch_one=True)
-        try:
-            return db_channel_name_str[0].lower()
-        except TypeError as e:
-            raise ValueError(
-                f"No channel exists with id {channel_id}") from e
+        return cls.get_ticket(channel_id).channel_name.lower()
 
     @classmethod
     def update_status(cls, status: types.TicketStatus, channel_id: int):
@@ -341,7 +503,9 @@ class DatabaseManager():
         UPDATE requests
         SET status = $1 WHERE channel_id = $2"""
         values = (status, channel_id,)
-        cls._raw_update(query, values)
+        with cls._lock:
+            if cls._raw_update(query, values) and channel_id in cls._tickets:
+                cls._tickets[channel_id].status = status
 
     @classmethod
     def get_check(cls, channel_id: int) -> types.TicketCheck:
@@ -356,16 +520,7 @@ class DatabaseManager():
         -------
         `int(types.TicketCheck)`: the bg_check
         """
-        query = """
-        SELECT bg_check FROM requests 
-        WHERE channel_id = $1"""
-        values = (channel_id,)
-        bg_check = cls._raw_select(query, values, fetch_one=True)
-        try:
-            return bg_check[0]
-        except TypeError as e:
-            raise ValueError(
-                f"No channel exists with id {channel_id}") from e
+        return cls.get_ticket(channel_id).bg_check
 
     @classmethod
     def update_check(cls, bg_check: types.TicketCheck, channel_id: int):
@@ -381,7 +536,35 @@ class DatabaseManager():
         query = """
         UPDATE requests
         SET bg_check = $1 WHERE channel_id = $2"""
-        cls._raw_update(query, (bg_check, channel_id))
+        with cls._lock:
+            if cls._raw_update(query, (bg_check, channel_id)) and channel_id in cls._tickets:
+                cls._tickets[channel_id].bg_check = int(bg_check)
+
+    @classmethod
+    def update_activity(cls, channel_id: int, last_activity: float, last_author_id: int = None):
+        """records the latest message of a ticket, older messages are ignored
+
+        Parameters
+        ----------
+        channel_id : `int`
+            the channel id\n
+        last_activity : `float`
+            unix timestamp of the message\n
+        last_author_id : `int`, `optional`
+            the message author's id, None if unknown\n
+        """
+        query = """
+        UPDATE requests
+        SET last_activity = $1, last_author_id = $2
+        WHERE channel_id = $3 AND (last_activity IS NULL OR last_activity < $1)"""
+        values = (last_activity, last_author_id, channel_id,)
+        with cls._lock:
+            ticket = cls._tickets.get(channel_id)
+            if ticket is not None and ticket.last_activity is not None and ticket.last_activity >= last_activity:
+                return
+            if cls._raw_update(query, values) and ticket is not None:
+                ticket.last_activity = last_activity
+                ticket.last_author_id = last_author_id
 
     @classmethod
     def get_guild_safe_tickets(cls, guild_id: int) -> List[str]:
@@ -420,25 +603,156 @@ class DatabaseManager():
         return challenge
 
     @classmethod
-    def get_helpers_from_title(cls, title: str):
+    def get_helpers_from_title(cls, title: str) -> List[int]:
+        """gets the helpers who solved a challenge
+
+        Parameters
+        ----------
+        title : `str`
+            the challenge title\n
+
+        Returns
+        -------
+        `List[int]`: the helpers' discord ids
+        """
         query = """
-        SELECT helper_id_list FROM challenges 
-        WHERE title = $1"""
+        SELECT challenge_helpers.helper_id FROM challenges
+        JOIN challenge_helpers ON challenge_helpers.challenge_id = challenges.id
+        WHERE challenges.title = $1"""
         values = (title, )
-        return cls._raw_select(query, values, fetch_one=True)
+        return list(chain(*cls._raw_select(query, values)))
+
+    @classmethod
+    def get_challenge_helpers(cls, challenge_id: int) -> List[int]:
+        """gets the helpers who solved a challenge
+
+        Parameters
+        ----------
+        challenge_id : `int`
+            the challenge id\n
+
+        Returns
+        -------
+        `List[int]`: the helpers' discord ids
+        """
+        query = """
+        SELECT helper_id FROM challenge_helpers
+        WHERE challenge_id = $1"""
+        values = (challenge_id, )
+        return list(chain(*cls._raw_select(query, values)))
+
+    @classmethod
+    def get_available_challenge_helpers(cls, challenge_id: int) -> List[int]:
+        """gets the available helpers who solved a challenge
+
+        Parameters
+        ----------
+        challenge_id : `int`
+            the challenge id\n
+
+        Returns
+        -------
+        `List[int]`: the helpers' discord ids
+        """
+        query = """
+        SELECT challenge_helpers.helper_id FROM challenge_helpers
+        JOIN helpers ON helpers.discord_id = challenge_helpers.helper_id
+        WHERE challenge_helpers.challenge_id = $1 AND helpers.is_available = 1"""
+        values = (challenge_id, )
+        return list(chain(*cls._raw_select(query, values)))
+
+    @classmethod
+    def get_helper_challenges(cls, helper_id: int) -> List[int]:
+        """gets the challenges a helper has solved
+
+        Parameters
+        ----------
+        helper_id : `int`
+            the helper's discord id\n
+
+        Returns
+        -------
+        `List[int]`: the challenge ids
+        """
+        query = """
+        SELECT challenge_id FROM challenge_helpers
+        WHERE helper_id = $1"""
+        values = (helper_id, )
+        return list(chain(*cls._raw_select(query, values)))
+
+    @classmethod
+    def get_helpers_challenges(cls, helper_ids: List[int]) -> Dict[int, Set[int]]:
+        """gets the challenges many helpers are credited with at once
+
+        Parameters
+        ----------
+        helper_ids : `List[int]`
+            the helpers' discord ids\n
+
+        Returns
+        -------
+        `Dict[int, Set[int]]`: challenge ids by helper id, helpers without credits are left out
+        """
+        credited = {}
+        helper_ids = list(set(helper_ids))
+        # stay below SQLite's bound parameter limit
+        for i in range(0, len(helper_ids), 500):
+            chunk = helper_ids[i:i + 500]
+            query = f"""
+            SELECT helper_id, challenge_id FROM challenge_helpers
+            WHERE helper_id IN ({','.join('?' * len(chunk))})"""
+            for helper_id, challenge_id in cls._raw_select(query, chunk):
+                credited.setdefault(helper_id, set()).add(challenge_id)
+        return credited
 
     @classmethod
     def refresh_database_ch(cls, challenges: List[Challenge]):
-        delete_query = "DELETE FROM challenges"
-        cls._raw_delete(delete_query)
+        """syncs the challenges table with the released challenges
+
+        New challenges are inserted, changed ones updated and unreleased ones
+        removed in a single transaction. Helper assignments of challenges
+        that still exist are kept.
+
+        Parameters
+        ----------
+        challenges : `List[Challenge]`
+            all released challenges\n
+        """
+        select_query = "SELECT id, title, author, category, ignore FROM challenges"
         insert_query = """
-        INSERT INTO challenges(id, title, author, category, ignore, helper_id_list)
-        VALUES($1,$2,$3,$4,$5,$6)"""
-        for id_, title, author, category, ignore, _ in challenges:
-            values = (id_, title, author, category, ignore, str([]))
-            cls._raw_insert(insert_query, values)
+        INSERT INTO challenges(id, title, author, category, ignore)
+        VALUES($1,$2,$3,$4,$5)"""
+        update_query = """
+        UPDATE challenges
+        SET title = $1, author = $2, category = $3, ignore = $4 WHERE id = $5"""
+        delete_query = """
+        DELETE FROM challenges
+        WHERE id = $1"""
+        delete_helpers_query = """
+        DELETE FROM challenge_helpers
+        WHERE challenge_id = $1"""
 
-        # all_helpers = {guild.get_member_named(ch.author) for ch in challenges}
+        released = {ch.id: ch for ch in challenges}
+        try:
+            with cls._transaction() as cur:
+                existing = {row['id']: (row['title'], row['author'], row['category'], bool(row['ignore']))
+                            for row in cur.execute(select_query)}
+                new = [(ch.id, ch.title, ch.author, ch.category, ch.ignore)
+                       for ch in released.values() if ch.id not in existing]
+                changed = [(ch.title, ch.author, ch.category, ch.ignore, ch.id)
+                           for ch in released.values() if ch.id in existing
+                           and existing[ch.id] != (ch.title, ch.author, ch.category, bool(ch.ignore))]
+                removed = [(id_,) for id_ in existing if id_ not in released]
+
+                cur.executemany(insert_query, new)
+                cur.executemany(update_query, changed)
+                cur.executemany(delete_query, removed)
+                cur.executemany(delete_helpers_query, removed)
+        except Exception as e:
+            log.exception(str(e))
+            return
+        log.info(
+            f"Refreshed challenges: {len(new)} new, {len(changed)} changed, {len(removed)} removed")
 
     @classmethod
     def create_helper(cls, discord_id: int):
@@ -488,26 +802,152 @@ class DatabaseManager():
         cls._raw_update(query, values)
 
     @classmethod
-    def update_helpers_ch(cls, helper_id_list: List[int], challenge_id: int):
-        helpers = json.dumps(helper_id_list)
+    def add_helper_challenges(cls, helper_id: int, challenge_ids: List[int]):
+        """credits a helper with all the challenges they solved
+
+        Parameters
+        ----------
+        helper_id : `int`
+            the helper's discord id\n
+        challenge_ids : `List[int]`
+            the solved challenge ids\n
+
+        Raises
+        ------
+        `exceptions.ChallengeDoesNotExist`: a solved challenge is not in the database,
+        the known challenges are still credited
+        """
+        cls.add_helpers_challenges({helper_id: challenge_ids})
+
+    @classmethod
+    def add_helpers_challenges(cls, solves: Dict[int, List[int]]):
+        """credits many helpers with the challenges they solved in one transaction
+
+        Parameters
+        ----------
+        solves : `Dict[int, List[int]]`
+            the solved challenge ids of each helper's discord id\n
+
+        Raises
+        ------
+        `exceptions.ChallengeDoesNotExist`: a solved challenge is not in the database,
+        the known challenges are still credited
+        """
+        with cls._transaction() as cur:
+            missing = cls._credit_helpers(cur, solves)
+        if missing:
+            raise exceptions.ChallengeDoesNotExist(missing[0])
+
+    @classmethod
+    def replace_helpers_challenges(cls, solves: Dict[int, List[int]], helper_ids: Iterable[int] = None):
+        """replaces the credited challenges of many helpers in one transaction,
+        dropping credits that are no longer solved
+
+        Parameters
+        ----------
+        solves : `Dict[int, List[int]]`
+            the solved challenge ids of each helper's discord id\n
+        helper_ids : `Iterable[int]`, `optional`
+            every current helper, the credits of anyone else are dropped too, by default None\n
+
+        Raises
+        ------
+        `exceptions.ChallengeDoesNotExist`: a solved challenge is not in the database,
+        the known challenges are still credited
+        """
+        with cls._transaction() as cur:
+            replaced = set(solves)
+            if helper_ids is not None:
+                credited = {row[0] for row in cur.execute("SELECT DISTINCT helper_id FROM challenge_helpers")}
+                replaced |= credited.difference(helper_ids)
+            cur.executemany("DELETE FROM challenge_helpers WHERE helper_id = $1",
+                            [(helper_id,) for helper_id in replaced])
+            missing = cls._credit_helpers(cur, solves)
+        if missing:
+            raise exceptions.ChallengeDoesNotExist(missing[0])
+
+    @staticmethod
+    def _credit_helpers(cur: sqlite3.Cursor, solves: Dict[int, List[int]]) -> List[int]:
+        """inserts the credits of known challenges, returns the unknown challenge ids"""
         query = """
-        UPDATE challenges
-        SET helper_id_list = $1 WHERE id = $2"""
-        values = (helpers, challenge_id,)
-        cls._raw_update(query, values)
+        INSERT OR IGNORE INTO challenge_helpers(challenge_id, helper_id)
+        SELECT id, $1 FROM challenges WHERE id = $2"""
+        values = [(helper_id, challenge_id,)
+                  for helper_id, challenge_ids in solves.items() for challenge_id in challenge_ids]
+        cur.executemany(query, values)
+        known = {row[0] for row in cur.execute("SELECT id FROM challenges")}
+        return [id_ for _, id_ in values if id_ not in known]
 
     @classmethod
-    def update_helper_ch(cls, helper_id: int, challenge_id: int):
-        challenge = cls.get_challenge_from_id(challenge_id)
-        if challenge is None:
-            raise exceptions.ChallengeDoesNotExist(challenge_id)
-        challenge = Challenge(*challenge)
+    def get_team(cls, discord_id: int, fetched_after: float = 0) -> Optional[int]:
+        """gets the CTF platform team of a discord user
 
-        helpers = json.loads(challenge.helper_id_list)
-        helpers.append(helper_id)
-        helpers = json.dumps(list(set(helpers)))
+        Parameters
+        ----------
+        discord_id : `int`
+            the user's discord id\n
+        fetched_after : `float`, `optional`
+            unix timestamp older mappings are ignored before, by default 0\n
+
+        Returns
+        -------
+        `Optional[int]`: the team id, None for a solo player
+
+        Raises
+        ------
+        `ValueError`: the team of the user is not known or too old
+        """
         query = """
-        UPDATE challenges
-        SET helper_id_list = $1 WHERE id = $2"""
-        values = (helpers, challenge_id,)
-        cls._raw_update(query, values)
+        SELECT team_id FROM teams
+        WHERE discord_id = $1 AND fetched_at > $2"""
+        values = (discord_id, fetched_after)
+        team = cls._raw_select(query, values, fetch_one=True)
+        if team is None:
+            raise ValueError(f"No team known for {discord_id}")
+        return team[0]
+
+    @classmethod
+    def set_teams(cls, teams: Dict[int, Optional[int]]):
+        """stores the CTF platform teams of discord users
+
+        Parameters
+        ----------
+        teams : `Dict[int, Optional[int]]`
+            team id by discord id, None for solo players\n
+        """
+        query = """
+        INSERT INTO teams(discord_id, team_id, fetched_at) VALUES($1, $2, $3)
+        ON CONFLICT(discord_id) DO UPDATE SET team_id = excluded.team_id, fetched_at = excluded.fetched_at"""
+        now = time.time()
+        values = [(discord_id, team_id, now) for discord_id, team_id in teams.items()]
+        with cls._transaction() as cur:
+            cur.executemany(query, values)
+
+
+class AsyncDatabaseManager():
+    """Awaitable Database Actions
+
+    Every public DatabaseManager method is exposed here as a coroutine.
+    Calls are queued onto one dedicated database thread, so queries run
+    in order and never block the event loop.
+    """
+
+    _executor = ThreadPoolExecutor(
+        max_workers=1, thread_name_prefix="database")
+
+    @classmethod
+    async def _run(cls, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(cls._executor, functools.partial(func, *args, **kwargs))
+
+
+def _awaitable(method):
+    @functools.wraps(method)
+    async def wrapper(cls, *args, **kwargs):
+        return await cls._run(method, *args, **kwargs)
+    return classmethod(wrapper)
+
+
+for _name, _method in inspect.getmembers(DatabaseManager, inspect.ismethod):
+    if not _name.startswith('_'):
+        setattr(AsyncDatabaseManager, _name, _awaitable(_method))
@@ -0,0 +1,164 @@
+import os
+import gzip
+import shutil
+import json
+import sqlite3
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, NamedTuple
+import logging
+
+log = logging.getLogger(__name__)
+
+DISCORD_EPOCH_MS = 1420070400000
+
+class MaintenanceReport(NamedTuple):
+    archived_rows: int
+    export_files: List[str]
+    bytes_before: int
+    bytes_after: int
+
+    @property
+    def bytes_reclaimed(self) -> int:
+        return self.bytes_before - self.bytes_after
+
+    def __repr__(self):
+        return (f"MaintenanceReport({self.archived_rows} rows exported to {len(self.export_files)} files, "
+                f"{self.bytes_reclaimed} bytes reclaimed)")
+
+def database_size(conn: sqlite3.Connection) -> int:
+    """gets the size of the database file in bytes
+
+    Parameters
+    ----------
+    conn : `sqlite3.Connection`
+        the connection\n
+
+    Returns
+    -------
+    `int`: size in bytes
+    """
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+    return page_size * page_count
+
+def _created_at(channel_id: int) -> datetime:
+    """the creation time of a channel, from its snowflake"""
+    return datetime.fromtimestamp(((int(channel_id) >> 22) + DISCORD_EPOCH_MS) / 1000, tz=timezone.utc)
+
+def _write_copy(path: str, rows: List[sqlite3.Row]):
+    """writes the export file with the rows appended to path.tmp"""
+    if os.path.exists(path):
+        shutil.copyfile(path, path + ".tmp")
+    # "wb" drops a copy left behind by an interrupted run
+    with open(path + ".tmp", "ab" if os.path.exists(path) else "wb") as raw:
+        # every run appends a new gzip member, which gzip readers concatenate
+        with gzip.open(raw, "at", encoding="utf-8") as file:
+            for row in rows:
+                record = {key: row[key] for key in row.keys() if key != 'rowid'}
+                file.write(json.dumps(record) + "\n")
+        raw.flush()
+        os.fsync(raw.fileno())
+
+def export_old_archive(conn: sqlite3.Connection, max_age_days: int, export_dir: str, season_format: str) -> Dict[str, int]:
+    """moves archived tickets older than max_age_days into compressed,
+    append-only json lines files, one per season
+
+    The age of a ticket is taken from its channel's creation time.
+    Rows are only deleted after they have been written to disk, and the
+    export files only change once the rows are deleted.
+
+    Parameters
+    ----------
+    conn : `sqlite3.Connection`
+        the connection\n
+    max_age_days : `int`
+        minimum age of a ticket to be exported\n
+    export_dir : `str`
+        directory of the export files\n
+    season_format : `str`
+        strftime format naming the season of a ticket\n
+
+    Returns
+    -------
+    `Dict[str, int]`: number of exported rows per export file
+    """
+    cutoff = datetime.now(timezone.utc) - timedelta(days=max_age_days)
+    cutoff_snowflake = (int(cutoff.timestamp() * 1000) -
+                        DISCORD_EPOCH_MS) << 22
+    query = """
+    SELECT rowid, * FROM archive
+    WHERE channel_id < $1"""
+    rows = conn.execute(query, (cutoff_snowflake,)).fetchall()
+    if not rows:
+        return {}
+
+    seasons = defaultdict(list)
+    for row in rows:
+        seasons[_created_at(row['channel_id']).strftime(season_format)].append(row)
+
+    os.makedirs(export_dir, exist_ok=True)
+    exported = {}
+    try:
+        for season, season_rows in seasons.items():
+            path = os.path.join(export_dir, f"archive-{season}.jsonl.gz")
+            exported[path] = len(season_rows)
+            # written to a copy that only replaces the season file once the
+            # rows are deleted, so a failed run leaves neither changed
+            _write_copy(path, season_rows)
+
+        with conn:
+            conn.executemany("DELETE FROM archive WHERE rowid = $1",
+                             [(row['rowid'],) for row in rows])
+    except BaseException:
+        for path in exported:
+            if os.path.exists(path + ".tmp"):
+                os.remove(path + ".tmp")
+        raise
+    for path in exported:
+        os.replace(path + ".tmp", path)
+    return exported
+
+def optimize(conn: sqlite3.Connection):
+    """returns free pages to the file system and refreshes the planner statistics
+
+    Parameters
+    ----------
+    conn : `sqlite3.Connection`
+        the connection\n
+    """
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        # switching an existing database to incremental needs one full vacuum
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("VACUUM")
+    conn.execute("PRAGMA incremental_vacuum").fetchall()
+    conn.execute("ANALYZE")
+    conn.execute("PRAGMA optimize")
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+def run(conn: sqlite3.Connection, max_age_days: int, export_dir: str, season_format: str) -> MaintenanceReport:
+    """exports the old archive and compacts the database
+
+    Parameters
+    ----------
+    conn : `sqlite3.Connection`
+        the connection\n
+    max_age_days : `int`
+        minimum age of a ticket to be exported\n
+    export_dir : `str`
+        directory of the export files\n
+    season_format : `str`
+        strftime format naming the season of a ticket\n
+
+    Returns
+    -------
+    `MaintenanceReport`: what was exported and how much space was reclaimed
+    """
+    bytes_before = database_size(conn)
+    exported = export_old_archive(conn, max_age_days, export_dir, season_format)
+    optimize(conn)
+    bytes_after = database_size(conn)
+    report = MaintenanceReport(sum(exported.values()), list(exported),
+                               bytes_before, bytes_after)
+    log.info(report)
+    return report
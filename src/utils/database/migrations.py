@@ -0,0 +1,142 @@
+import os
+import sqlite3
+from typing import List
+import logging
+
+log = logging.getLogger(__name__)
+
+SCHEMA_FILE = os.path.join(os.path.dirname(__file__), 'bot_schema.sql')
+
+def _base_schema() -> str:
+    with open(SCHEMA_FILE, encoding='utf-8') as file:
+        return file.read()
+
+# MIGRATIONS[n] upgrades the schema from version n to n + 1.
+# Only ever append to this list, never edit a released migration.
+MIGRATIONS: List[str] = [
+    # 1: base tables, see bot_schema.sql
+    _base_schema(),
+    # 2: indexes matching the hot query shapes
+    """
+    CREATE INDEX IF NOT EXISTS idx_requests_channel
+    ON requests(channel_id);
+    CREATE INDEX IF NOT EXISTS idx_requests_guild_type
+    ON requests(guild_id, t_type);
+    CREATE INDEX IF NOT EXISTS idx_requests_user_type_status
+    ON requests(user_id, t_type, status);
+    CREATE INDEX IF NOT EXISTS idx_requests_guild_check
+    ON requests(guild_id, bg_check);
+    CREATE INDEX IF NOT EXISTS idx_archive_guild_type
+    ON archive(guild_id, t_type);
+    CREATE INDEX IF NOT EXISTS idx_challenges_title
+    ON challenges(title);
+    ANALYZE;
+    """,
+    # 3: per-guild ticket number counters, backfilled from existing tickets
+    """
+    CREATE TABLE IF NOT EXISTS ticket_counters (
+      guild_id bigint,
+      t_type varchar(255),
+      next_number INTEGER NOT NULL,
+      PRIMARY KEY (guild_id, t_type)
+    );
+    INSERT OR IGNORE INTO ticket_counters(guild_id, t_type, next_number)
+    SELECT guild_id, t_type, count(1) FROM
+    (SELECT * FROM requests UNION SELECT * FROM archive)
+    GROUP BY guild_id, t_type;
+    """,
+    # 4: challenge_helpers join table replacing the helper_id_list JSON column,
+    # cleared of a helper's credits when the helper is deleted
+    """
+    CREATE TABLE IF NOT EXISTS challenge_helpers (
+      challenge_id INTEGER NOT NULL,
+      helper_id INTEGER NOT NULL,
+      PRIMARY KEY (challenge_id, helper_id)
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS idx_challenge_helpers_helper
+    ON challenge_helpers(helper_id);
+    CREATE TRIGGER IF NOT EXISTS trg_helpers_delete_challenge_helpers
+    AFTER DELETE ON helpers
+    BEGIN
+      DELETE FROM challenge_helpers WHERE helper_id = OLD.discord_id;
+    END;
+    INSERT OR IGNORE INTO challenge_helpers(challenge_id, helper_id)
+    SELECT challenges.id, json_each.value FROM challenges, json_each(challenges.helper_id_list)
+    WHERE json_valid(challenges.helper_id_list);
+
+    CREATE TABLE challenges_new (
+      id INTEGER UNIQUE,
+      title VARCHAR(255),
+      author VARCHAR(255),
+      category VARCHAR(255),
+      ignore BOOLEAN
+    );
+    INSERT INTO challenges_new(id, title, author, category, ignore)
+    SELECT id, title, author, category, ignore FROM challenges;
+    DROP TABLE challenges;
+    ALTER TABLE challenges_new RENAME TO challenges;
+    CREATE INDEX IF NOT EXISTS idx_challenges_title
+    ON challenges(title);
+    """,
+    # 5: last activity of a ticket, kept on archive too so both tables stay aligned
+    """
+    ALTER TABLE requests ADD COLUMN last_activity REAL;
+    ALTER TABLE requests ADD COLUMN last_author_id bigint;
+    ALTER TABLE archive ADD COLUMN last_activity REAL;
+    ALTER TABLE archive ADD COLUMN last_author_id bigint;
+    """,
+    # 6: CTF platform team of a discord user, team_id is NULL for solo players
+    """
+    CREATE TABLE IF NOT EXISTS teams (
+      discord_id INTEGER PRIMARY KEY,
+      team_id INTEGER,
+      fetched_at REAL NOT NULL
+    );
+    """,
+]
+
+def schema_version(conn: sqlite3.Connection) -> int:
+    """gets the schema version stored in the database
+
+    Parameters
+    ----------
+    conn : `sqlite3.Connection`
+        the connection\n
+
+    Returns
+    -------
+    `int`: the schema version
+    """
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def migrate(conn: sqlite3.Connection) -> int:
+    """creates or upgrades the schema to the latest version
+
+    Each migration runs in its own transaction together with the
+    version bump, so a failed migration leaves the previous version intact.
+
+    Parameters
+    ----------
+    conn : `sqlite3.Connection`
+        the connection\n
+
+    Returns
+    -------
+    `int`: the schema version after migrating
+    """
+    version = schema_version(conn)
+    if version > len(MIGRATIONS):
+        raise RuntimeError(
+            f"Database schema version {version} is newer than this bot ({len(MIGRATIONS)})")
+
+    for number, script in enumerate(MIGRATIONS[version:], start=version + 1):
+        try:
+            conn.executescript(
+                f"BEGIN;\n{script}\nPRAGMA user_version = {number};\nCOMMIT;")
+        except sqlite3.Error:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            log.critical(f"Database migration {number} failed")
+            raise
+        log.info(f"Migrated database to schema version {number}")
+    return schema_version(conn)
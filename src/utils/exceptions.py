@@ -1,9 +1,12 @@
-class MaxChannelTicketError(Exception):
-    """Raised when the max number of tickets has been reached per category"""
-
 class MaxUserTicketError(Exception):
     """Raised when the max number of tickets has been reached per user"""
 
+class CreationQueueFull(Exception):
+    """Raised when too many ticket creations are pending in a guild"""
+
+class APIError(Exception):
+    """Raised when a CTF API request fails and its caller cannot use a stale or empty response"""
+
 class NoChallengeSelected(Exception):
     """Raised when no challenge is selected"""
 
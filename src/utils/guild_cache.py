@@ -0,0 +1,226 @@
+import asyncio
+from typing import Dict, List, Optional, Set
+import logging
+
+import discord
+from discord.utils import get
+
+import config
+from utils import types
+from utils.options import Options
+
+log = logging.getLogger(__name__)
+
+_MISSING = object()
+# Discord's limit of channels in a category
+SHARD_SIZE = 50
+
+class GuildCache():
+    """Roles, categories and channels of a guild, resolved once by name
+
+    Lookups are memoized until an on_guild_role_* or on_guild_channel_*
+    event invalidates them (see cogs/events.py). Missing roles and
+    channels are memoized as None too.
+    """
+
+    _guilds: Dict[int, "GuildCache"] = {}
+
+    def __init__(self, guild: discord.Guild):
+        self.guild = guild
+        self._roles: Dict[str, Optional[discord.Role]] = {}
+        self._categories: Dict[str, Optional[discord.CategoryChannel]] = {}
+        self._shards: Dict[str, List[discord.CategoryChannel]] = {}
+        self._shard_locks: Dict[str, asyncio.Lock] = {}
+        self._placed: Dict[int, Set[int]] = {}
+        self._log_channel = _MISSING
+        self._admin_ids: Optional[Set[int]] = None
+
+    @classmethod
+    def of(cls, guild: discord.Guild) -> "GuildCache":
+        """gets the cache of a guild
+
+        Parameters
+        ----------
+        guild : `discord.Guild`
+            the guild\n
+
+        Returns
+        -------
+        `GuildCache`: the guild's cache
+        """
+        cache = cls._guilds.get(guild.id)
+        if cache is None:
+            cache = cls._guilds[guild.id] = cls(guild)
+        elif cache.guild is not guild:  # the guild object was replaced on reconnect
+            cache.guild = guild
+            cache.invalidate_roles()
+            cache.invalidate_channels()
+        return cache
+
+    @classmethod
+    def forget(cls, guild_id: int):
+        cls._guilds.pop(guild_id, None)
+
+    def invalidate_roles(self):
+        self._roles.clear()
+        self._admin_ids = None
+
+    def invalidate_channels(self):
+        self._categories.clear()
+        self._shards.clear()
+        self._log_channel = _MISSING
+
+    def invalidate_members(self):
+        self._admin_ids = None
+
+    def role(self, key: str) -> Optional[discord.Role]:
+        """gets a configured role
+
+        Parameters
+        ----------
+        key : `str`
+            key of the role in config.roles\n
+
+        Returns
+        -------
+        `Optional[discord.Role]`: the role
+        """
+        if key not in self._roles:
+            self._roles[key] = get(self.guild.roles, name=config.roles[key])
+        return self._roles[key]
+
+    @property
+    def admin_role(self) -> Optional[discord.Role]:
+        return self.role('admin')
+
+    @property
+    def admin_ids(self) -> Set[int]:
+        """ids of every member with the admin role"""
+        if self._admin_ids is None:
+            admin = self.admin_role
+            self._admin_ids = {
+                member.id for member in admin.members} if admin else set()
+        return self._admin_ids
+
+    def category(self, name: str) -> Optional[discord.CategoryChannel]:
+        """gets a category by name
+
+        Parameters
+        ----------
+        name : `str`
+            the category name\n
+
+        Returns
+        -------
+        `Optional[discord.CategoryChannel]`: the category
+        """
+        if name not in self._categories:
+            self._categories[name] = get(self.guild.categories, name=name)
+        return self._categories[name]
+
+    def shards(self, name: str) -> List[discord.CategoryChannel]:
+        """gets every shard of a category, in shard order
+
+        Parameters
+        ----------
+        name : `str`
+            the category name\n
+
+        Returns
+        -------
+        `List[discord.CategoryChannel]`: the shards, empty if there are none
+        """
+        if name not in self._shards:
+            self._shards[name] = sorted(
+                (category for category in self.guild.categories
+                 if Options.shard_base(category.name) == name),
+                key=lambda category: Options.shard_index(category.name))
+        return self._shards[name]
+
+    def shard_lock(self, name: str) -> asyncio.Lock:
+        """lock held while picking a shard of a category and putting a channel in it"""
+        if name not in self._shard_locks:
+            self._shard_locks[name] = asyncio.Lock()
+        return self._shard_locks[name]
+
+    def shard_size(self, category: discord.CategoryChannel) -> int:
+        """counts the channels of a shard
+
+        Channels placed in it whose gateway event has not arrived yet are
+        counted too, category.channels does not list them.
+
+        Parameters
+        ----------
+        category : `discord.CategoryChannel`
+            the shard\n
+
+        Returns
+        -------
+        `int`: number of channels, a shard holds at most SHARD_SIZE
+        """
+        placed = self._placed.get(category.id, set())
+        placed.difference_update(channel.id for channel in category.channels)
+        return len(category.channels) + len(placed)
+
+    def place(self, category: discord.CategoryChannel, channel_id: int):
+        """remembers a channel the bot just created in or moved to a shard"""
+        self.unplace(channel_id)
+        self._placed.setdefault(category.id, set()).add(channel_id)
+
+    def unplace(self, channel_id: int):
+        """drops a deleted channel from the placed ones"""
+        for placed in self._placed.values():
+            placed.discard(channel_id)
+
+    def ticket_categories(self, ticket_type: types.TicketType) -> List[discord.CategoryChannel]:
+        return self.shards(Options.full_category_name(ticket_type))
+
+    @property
+    def closed_categories(self) -> List[discord.CategoryChannel]:
+        return self.shards("Closed Tickets")
+
+    @property
+    def log_category(self) -> Optional[discord.CategoryChannel]:
+        return self.category(config.logs['category'])
+
+    @property
+    def log_channel(self) -> Optional[discord.TextChannel]:
+        """the ticket log channel, preferring the one in the logs category"""
+        if self._log_channel is _MISSING:
+            channel = None
+            if self.log_category is not None:
+                channel = get(self.log_category.text_channels,
+                              name=config.logs['name'])
+            self._log_channel = channel or get(
+                self.guild.text_channels, name=config.logs['name'])
+        return self._log_channel
+
+    def add_category(self, category: discord.CategoryChannel):
+        """remembers a category the bot just created
+
+        Parameters
+        ----------
+        category : `discord.CategoryChannel`
+            the new category\n
+        """
+        self._categories[category.name] = category
+        # guild.categories may not list it before its gateway event
+        shards = self.shards(Options.shard_base(category.name))
+        if category not in shards:
+            shards.append(category)
+            shards.sort(key=lambda shard: Options.shard_index(shard.name))
+
+    def remove_category(self, category: discord.CategoryChannel):
+        """forgets a category the bot just deleted
+
+        Parameters
+        ----------
+        category : `discord.CategoryChannel`
+            the deleted category\n
+        """
+        self._categories.pop(category.name, None)
+        # guild.categories may still list it before its gateway event
+        shards = self.shards(Options.shard_base(category.name))
+        if category in shards:
+            shards.remove(category)
+        self._placed.pop(category.id, None)
@@ -1,3 +1,6 @@
+import typing
+from typing import Set
+
 import discord
 
 from utils import types
@@ -79,6 +82,67 @@ If you want to close this ticket, click on the :lock:""",
                "misc": "support tickets"}
         return msg[ticket_type]
 
+    @staticmethod
+    def ticket_categories() -> Set[str]:
+        """names of every category that holds ticket channels,
+        see `shard_base` for the names of their shards
+
+        Returns
+        -------
+        `Set[str]`: category names
+        """
+        return {Options.full_category_name(ticket_type)
+                for ticket_type in typing.get_args(types.TicketType)} | {"Closed Tickets"}
+
+    @staticmethod
+    def shard_name(category_name: str, shard: int) -> str:
+        """gets the name of a category shard, the first shard keeps the plain name
+
+        Parameters
+        ----------
+        category_name : `str`
+            name of the category\n
+        shard : `int`
+            shard number, starting at 1\n
+
+        Returns
+        -------
+        `str`: shard name
+        """
+        return category_name if shard == 1 else f"{category_name} {shard}"
+
+    @staticmethod
+    def shard_base(name: str) -> str:
+        """gets the category name of a shard, e.g. "support tickets" for "support tickets 2"
+
+        Parameters
+        ----------
+        name : `str`
+            shard name\n
+
+        Returns
+        -------
+        `str`: category name
+        """
+        base, _, shard = name.rpartition(' ')
+        return base if base and shard.isdigit() else name
+
+    @staticmethod
+    def shard_index(name: str) -> int:
+        """gets the shard number of a category shard
+
+        Parameters
+        ----------
+        name : `str`
+            shard name\n
+
+        Returns
+        -------
+        `int`: shard number, starting at 1
+        """
+        base, _, shard = name.rpartition(' ')
+        return int(shard) if base and shard.isdigit() else 1
+
     @staticmethod
     def name_open(ticket_type: types.TicketType, count: int = None, user: discord.user.User = None) -> str:
         """gets the name of an opened ticket
@@ -0,0 +1,105 @@
+import time
+import heapq
+import asyncio
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+import logging
+
+log = logging.getLogger(__name__)
+
+class DeadlineScheduler():
+    """Calls a callback once per key when its deadline passes
+
+    Deadlines live in a min-heap. Re-arming or cancelling a key leaves its
+    old heap entry behind, which is skipped when it reaches the top, so
+    every operation is O(log n) and the runner only wakes for the earliest
+    live deadline.
+
+    A key whose callback raises is re-armed retry_seconds later, unless the
+    callback already re-armed or cancelled it.
+    """
+
+    def __init__(self, callback: Callable[[int], Awaitable], concurrency: int = 10,
+                 retry_seconds: float = 3600):
+        self._callback = callback
+        self._retry_seconds = retry_seconds
+        self._heap: List[Tuple[float, int]] = []
+        self._deadlines: Dict[int, float] = {}
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._deadlines)
+
+    def __contains__(self, key: int) -> bool:
+        return key in self._deadlines
+
+    def schedule(self, key: int, deadline: float):
+        """arms or re-arms a key
+
+        Parameters
+        ----------
+        key : `int`
+            the key passed to the callback\n
+        deadline : `float`
+            unix timestamp to call the callback at\n
+        """
+        self._deadlines[key] = deadline
+        heapq.heappush(self._heap, (deadline, key))
+        if self._heap[0] == (deadline, key):
+            self._wakeup.set()
+        if len(self._heap) > 2 * len(self._deadlines) + 64:
+            self._compact()
+
+    def cancel(self, key: int):
+        """disarms a key
+
+        Parameters
+        ----------
+        key : `int`
+            the key\n
+        """
+        self._deadlines.pop(key, None)
+
+    def start(self):
+        """starts the runner task if it is not running yet"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_event_loop().create_task(self._run())
+
+    def stop(self):
+        """stops the runner task, armed keys are kept"""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def _compact(self):
+        self._heap = [(deadline, key) for key, deadline in self._deadlines.items()]
+        heapq.heapify(self._heap)
+
+    def _pop_stale(self):
+        while self._heap and self._deadlines.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+
+    async def _fire(self, key: int):
+        async with self._semaphore:
+            try:
+                await self._callback(key)
+            except Exception:
+                log.exception(f"Deadline callback failed for {key}, retrying in {self._retry_seconds}s")
+                if key not in self._deadlines:
+                    self.schedule(key, time.time() + self._retry_seconds)
+
+    async def _run(self):
+        while True:
+            self._pop_stale()
+            timeout = self._heap[0][0] - time.time() if self._heap else None
+            if timeout is None or timeout > 0:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            _, key = heapq.heappop(self._heap)
+            del self._deadlines[key]
+            asyncio.get_event_loop().create_task(self._fire(key))
@@ -4,10 +4,10 @@ from typing import NamedTuple, Tuple, Union
 import logging
 
 import discord
-from discord.ext import commands
 import chat_exporter
 
-import config
+from utils.guild_cache import GuildCache
+from utils.webhook_cache import WebhookCache
 
 log = logging.getLogger(__name__)
 
@@ -57,8 +57,7 @@ class UI:
         else:
             log_embed = cls.log_embed(
                 title, channel_name, **kwargs)
-        log_channel = discord.utils.get(
-            channel_name.guild.text_channels, name=config.logs['name'])
+        log_channel = GuildCache.of(channel_name.guild).log_channel
         await log_channel.send(embed=log_embed)
 
     @staticmethod
@@ -128,34 +127,24 @@ class Utility:
         await ctx.message.delete(delay=time)
 
     @staticmethod
-    async def say_in_webhook(bot: commands.Bot, member: discord.Member, channel: discord.TextChannel, avatar_url: discord.Asset.url, allow_mention: bool, message: str, return_message: bool = False, **kwargs):
-        avatar = await member.avatar.read()
-        webhooks = await channel.webhooks()
-
-        if len(webhooks) == 0 or len([hook for hook in webhooks if hook.name == "Tickets"]) == 0:
-            send_web_hook = await channel.create_webhook(
-                name="Tickets", avatar=avatar)
-        else:
-            webhook_times = [
-                hook.created_at for hook in webhooks if hook.name == "Tickets"]
-
-            shortest = min(webhook_times)
-            for hook in webhooks:
-                if hook.created_at == shortest:
-                    send_web_hook = hook
-                    break
-
-        webhook = await bot.fetch_webhook(send_web_hook.id)
-        if allow_mention is True:
-            ret_message = await webhook.send(f'{message}', username=f'{member.display_name}', avatar_url=avatar_url, wait=True, **kwargs)
-        else:
-            ret_message = await webhook.send(f'{message}', username=f'{member.display_name}', avatar_url=avatar_url, wait=True, allowed_mentions=discord.AllowedMentions.none(), **kwargs)
+    async def say_in_webhook(member: discord.Member, channel: discord.TextChannel, avatar_url: discord.Asset.url, allow_mention: bool, message: str, return_message: bool = False, **kwargs):
+        if allow_mention is not True:
+            kwargs['allowed_mentions'] = discord.AllowedMentions.none()
+        for attempt in range(2):
+            webhook = await WebhookCache.get(channel, member)
+            try:
+                ret_message = await webhook.send(f'{message}', username=f'{member.display_name}', avatar_url=avatar_url, wait=True, **kwargs)
+                break
+            except discord.NotFound:  # the cached webhook was deleted
+                WebhookCache.invalidate(channel.id)
+                if attempt:
+                    raise
         if return_message:
             return channel.get_partial_message(ret_message.id)
 
     @staticmethod
     async def random_admin_member(guild) -> discord.Member:
-        role = discord.utils.get(guild.roles, name=config.roles['admin'])
+        role = GuildCache.of(guild).admin_role
         person = random.choice(role.members)
         return person
 
@@ -165,7 +154,32 @@ class Challenge(NamedTuple):
     author: str
     category: str
     ignore: bool = False
-    helper_id_list: str = str([])
 
     def __repr__(self):
         return f"{self.title}({self.id}, {self.author}, {self.category}, {self.ignore})"
+
+class TicketRecord():
+    """A ticket row of the requests table"""
+    __slots__ = ('channel_id', 'channel_name', 'guild_id', 'user_id', 't_type',
+                 'status', 'bg_check', 'last_activity', 'last_author_id')
+
+    def __init__(self, channel_id: int, channel_name: str, guild_id: int, user_id: int, t_type: str, status: str, bg_check: int,
+                 last_activity: float = None, last_author_id: int = None):
+        self.channel_id = int(channel_id)
+        self.channel_name = channel_name
+        self.guild_id = int(guild_id)
+        self.user_id = int(user_id)
+        self.t_type = t_type
+        self.status = status
+        self.bg_check = int(bg_check)
+        # unix timestamp and author of the last message in the channel
+        self.last_activity = last_activity
+        self.last_author_id = None if last_author_id is None else int(last_author_id)
+
+    @property
+    def number(self) -> str:
+        """the ticket number at the end of the channel name"""
+        return self.channel_name.lower().split("-")[-1]
+
+    def __repr__(self):
+        return f"{self.channel_name}({self.channel_id}, {self.t_type}, {self.status}, {self.bg_check})"
@@ -0,0 +1,74 @@
+from collections import OrderedDict
+from typing import Dict
+import logging
+
+import discord
+
+log = logging.getLogger(__name__)
+
+WEBHOOK_NAME = "Tickets"
+AVATAR_CACHE_SIZE = 64
+
+class WebhookCache():
+    """The webhook used to speak in each channel, and the avatars they were created with
+
+    A channel's webhook is looked up once and kept until an
+    on_webhooks_update event or a failed send invalidates it. Avatars are
+    only downloaded when a webhook has to be created, and the most recently
+    used ones are kept.
+    """
+
+    _webhooks: Dict[int, discord.Webhook] = {}
+    _avatars: "OrderedDict[str, bytes]" = OrderedDict()
+
+    @classmethod
+    def invalidate(cls, channel_id: int):
+        cls._webhooks.pop(channel_id, None)
+
+    @classmethod
+    async def avatar(cls, member: discord.Member) -> bytes:
+        """gets the avatar of a member
+
+        Parameters
+        ----------
+        member : `discord.Member`
+            the member\n
+
+        Returns
+        -------
+        `bytes`: the avatar image
+        """
+        key = member.avatar.key
+        if key in cls._avatars:
+            cls._avatars.move_to_end(key)
+        else:
+            cls._avatars[key] = await member.avatar.read()
+            if len(cls._avatars) > AVATAR_CACHE_SIZE:
+                cls._avatars.popitem(last=False)
+        return cls._avatars[key]
+
+    @classmethod
+    async def get(cls, channel: discord.TextChannel, member: discord.Member) -> discord.Webhook:
+        """gets the oldest webhook of a channel, creating one if there is none
+
+        Parameters
+        ----------
+        channel : `discord.TextChannel`
+            the channel\n
+        member : `discord.Member`
+            member whose avatar a new webhook is created with\n
+
+        Returns
+        -------
+        `discord.Webhook`: the webhook
+        """
+        if channel.id not in cls._webhooks:
+            webhooks = [hook for hook in await channel.webhooks()
+                        if hook.name == WEBHOOK_NAME and hook.token is not None]
+            if webhooks:
+                webhook = min(webhooks, key=lambda hook: hook.created_at)
+            else:
+                webhook = await channel.create_webhook(
+                    name=WEBHOOK_NAME, avatar=await cls.avatar(member))
+            cls._webhooks[channel.id] = webhook
+        return cls._webhooks[channel.id]